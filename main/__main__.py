@@ -0,0 +1,178 @@
+"""Command line entry point: `python -m main <command>`.
+
+Commands:
+    sync [URL] [--wrapped]        fetch a playlist (or every wrapped playlist) from Spotify
+    select                        pick the wrapped deck (spotify_tracks_wrapped_selected.json)
+    dedupe [FILES] [--all]        report fuzzy duplicates with different URLs
+    render [URL] [--selected] [--pages A-B]
+                                  write the card PDFs (only pages A-B's chunks)
+    combine [SLUG]                interleave a playlist's text and QR PDFs
+    pngs [URL] [--pages A-B]      write the card PNGs
+    unchecked [SLUG]              list tracks whose cards have not been checked
+    build [URL] [--wrapped]       sync, (select,) and render in one process
+
+Rendering is checkpointed in page chunks (see `main.chunked_build`): a
+rerun after a failure resumes where it stopped, and `--pages` lets several
+processes each build part of a deck in the same output directory.
+
+`--profile [REPORT]` times every stage of the command (see `main.profiling`).
+
+Each command only imports the modules it needs, so quick ones such as
+`unchecked` do not load PIL, reportlab or spotipy. The steps are the same
+functions the scripts in `main/` call, and `build` chains them in one warm
+process.
+
+Usage:
+    python -m main unchecked demo_waalkade
+    python -m main build --wrapped
+"""
+import argparse
+import os
+import sys
+
+# make repo root importable when run as `python main` or from elsewhere
+_repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _repo_root not in sys.path:
+    sys.path.insert(0, _repo_root)
+
+
+def _load_env():
+    # Load environment variables from .env if present
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+
+def cmd_sync(args):
+    if args.wrapped:
+        from main.export_spotify_tracks_wrapped import main as export_wrapped
+        return export_wrapped()
+    from main.export_spotify_tracks import export_playlist
+    return export_playlist(args.url)
+
+
+def cmd_select(args):
+    from main.select_tracks_wrapped import main as select_wrapped
+    select_wrapped()
+
+
+def cmd_dedupe(args):
+    from main.check_duplicates import main as check_duplicates
+    check_duplicates(args.files + (["--all"] if args.all else []) + (["--verify"] if args.verify else []))
+
+
+def _pages(args):
+    from main.chunked_build import parse_page_range
+    try:
+        return parse_page_range(getattr(args, "pages", None))
+    except ValueError as e:
+        raise SystemExit(f"error: {e}")
+
+
+def cmd_render(args, renderer=None):
+    if args.selected:
+        from main.generate_both_pdfs_selected import generate_selected_pdfs
+        return generate_selected_pdfs(renderer=renderer, pages=_pages(args))
+    from main.generate_both_pdfs import generate_pdfs
+    return generate_pdfs(args.url, renderer=renderer, pages=_pages(args))
+
+
+def cmd_combine(args):
+    from main.combine_pdfs import combine_duplex, select_playlist_slug
+    from main.config import COMBINED_OUTPUT_PDF_TEMPLATE, QR_OUTPUT_PDF_TEMPLATE, TEXT_OUTPUT_PDF_TEMPLATE
+    playlist_slug = args.slug or select_playlist_slug()
+    output_path = combine_duplex(
+        TEXT_OUTPUT_PDF_TEMPLATE.format(playlist_slug=playlist_slug),
+        QR_OUTPUT_PDF_TEMPLATE.format(playlist_slug=playlist_slug),
+        COMBINED_OUTPUT_PDF_TEMPLATE.format(playlist_slug=playlist_slug),
+    )
+    print(f"Combined PDF written to {output_path}")
+
+
+def cmd_pngs(args):
+    from main.export_card_pngs import export_card_pngs
+    export_card_pngs(args.url, pages=_pages(args))
+
+
+def cmd_unchecked(args):
+    from main.print_unchecked import DEFAULT_SLUG, print_unchecked
+    print_unchecked(args.slug or DEFAULT_SLUG)
+
+
+def cmd_build(args):
+    if args.wrapped:
+        from main.export_spotify_tracks_wrapped import main as export_wrapped
+        from main.select_tracks_wrapped import main as select_wrapped
+        export_wrapped()
+        select_wrapped()
+        return cmd_render(argparse.Namespace(selected=True, url=None))
+    from main.config import get_playlist_url
+    from main.export_spotify_tracks import export_playlist
+    # Resolve the URL once so an interactive prompt is not shown twice
+    url = args.url or get_playlist_url()
+    export_playlist(url)
+    return cmd_render(argparse.Namespace(selected=False, url=url))
+
+
+def build_parser():
+    from main.config import PROFILE_REPORT
+    parser = argparse.ArgumentParser(prog="python -m main", description="Hitster card pipeline.")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_REPORT, metavar="REPORT",
+                        help=f"Time every stage and write a JSON report (default: PROFILE_REPORT, {PROFILE_REPORT})")
+    parser.add_argument("--profile-stage", metavar="STAGE", help="Also run cProfile around this stage (e.g. card.text)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("sync", help="Fetch playlist tracks from Spotify")
+    p.add_argument("url", nargs="?", help="Playlist URL (default: PLAYLIST_URL or prompt)")
+    p.add_argument("--wrapped", action="store_true", help="Fetch every playlist in wrapped_hitster.json")
+    p.set_defaults(func=cmd_sync)
+
+    p = sub.add_parser("select", help="Select the wrapped deck")
+    p.set_defaults(func=cmd_select)
+
+    p = sub.add_parser("dedupe", help="Report fuzzy duplicates with different URLs")
+    p.add_argument("files", nargs="*", help="Track JSON files (default: spotify_tracks_wrapped_full.json)")
+    p.add_argument("--all", action="store_true", help="Check every playlist_list/spotify_tracks_*.json together")
+    p.add_argument("--verify", action="store_true", help="Also run the all-pairs scan and compare")
+    p.set_defaults(func=cmd_dedupe)
+
+    p = sub.add_parser("render", help="Write the card PDFs")
+    p.add_argument("url", nargs="?", help="Playlist URL (default: PLAYLIST_URL or prompt)")
+    p.add_argument("--selected", action="store_true", help="Render spotify_tracks_wrapped_selected.json")
+    p.add_argument("--pages", metavar="A-B", help="Only build the chunks covering these pages (1-based)")
+    p.set_defaults(func=cmd_render)
+
+    p = sub.add_parser("combine", help="Interleave a playlist's text and QR PDFs")
+    p.add_argument("slug", nargs="?", help="Playlist slug (default: choose from playlist_list/)")
+    p.set_defaults(func=cmd_combine)
+
+    p = sub.add_parser("pngs", help="Write the card PNGs")
+    p.add_argument("url", nargs="?", help="Playlist URL (default: PLAYLIST_URL or prompt)")
+    p.add_argument("--pages", metavar="A-B", help="Only render the cards on these PDF pages (1-based)")
+    p.set_defaults(func=cmd_pngs)
+
+    p = sub.add_parser("unchecked", help="List tracks whose cards have not been checked")
+    p.add_argument("slug", nargs="?", help="Playlist slug (default: oud_en_nieuw_hitster)")
+    p.set_defaults(func=cmd_unchecked)
+
+    p = sub.add_parser("build", help="Sync and render in one process")
+    p.add_argument("url", nargs="?", help="Playlist URL (default: PLAYLIST_URL or prompt)")
+    p.add_argument("--wrapped", action="store_true", help="Sync every wrapped playlist, select and render the deck")
+    p.set_defaults(func=cmd_build)
+    return parser
+
+
+def main(argv=None):
+    # Before parsing, so .env settings such as PROFILE_REPORT reach main.config
+    _load_env()
+    args = build_parser().parse_args(argv)
+    if args.profile or args.profile_stage:
+        from main import profiling
+        profiling.enable(report_path=args.profile, profile_stage=args.profile_stage)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
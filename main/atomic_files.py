@@ -0,0 +1,51 @@
+"""Write files atomically: to a temporary name in the same directory, then rename.
+
+Readers (other processes, other machines on a shared output directory) see
+either the old file or the complete new one, never half a file. The result
+gets the usual permissions for a new file under the current umask, like a
+plain `open(path, "w")`, instead of the private 0600 of `tempfile.mkstemp`.
+
+Usage:
+    atomic_write("out.json", data)
+    with atomic_path("deck.pdf") as tmp:
+        writer.write(tmp)
+"""
+import contextlib
+import os
+import tempfile
+
+
+def _file_mode():
+    # os.umask can only be read by setting it
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+_FILE_MODE = _file_mode()
+
+
+@contextlib.contextmanager
+def atomic_path(path):
+    """Yield a temporary path next to `path`; it replaces `path` when the block succeeds."""
+    out_dir = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(dir=out_dir, prefix=".", suffix=".tmp")
+    os.close(fd)
+    try:
+        yield tmp
+        os.chmod(tmp, _FILE_MODE)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def atomic_write(path, data):
+    """Write `data` (bytes or str, str as UTF-8) to `path` atomically."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    with atomic_path(path) as tmp:
+        with open(tmp, "wb") as f:
+            f.write(data)
+    return path
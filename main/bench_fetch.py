@@ -0,0 +1,130 @@
+"""Measure Spotify fetch throughput against the local stand-in API.
+
+Starts `main.fake_spotify` in-process, points `main.spotify_utils` at it and
+times:
+
+- `get_playlist_tracks` on single playlists of several sizes;
+- the wrapped exporter (`build_wrapped_full`) on a set of playlists, first
+  with an empty playlist cache and then again with a warm one;
+- both again with every Nth request answered by a 429.
+
+For each run it reports wall time, tracks per second and the requests the
+server saw. No credentials or network access are needed.
+
+Usage:
+    python main/bench_fetch.py
+    python main/bench_fetch.py --latency 0.1 --sizes 100 1000 5000 --workers 1 8 --json fetch.json
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+# make repo root importable like other scripts
+_repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _repo_root not in sys.path:
+    sys.path.insert(0, _repo_root)
+
+from main.fake_spotify import FakeSpotifyServer
+
+
+def _run(server, label, fn):
+    before = dict(server.counts)
+    start = time.perf_counter()
+    tracks = fn()
+    wall = time.perf_counter() - start
+    requests = {k: v - before.get(k, 0) for k, v in server.counts.items() if v - before.get(k, 0)}
+    result = {
+        "run": label,
+        "tracks": tracks,
+        "wall_s": round(wall, 3),
+        "tracks_per_s": round(tracks / wall, 1) if wall else None,
+        "requests": requests,
+    }
+    print(f"{label:<44} {tracks:>7} tracks {wall:>8.2f} s {result['tracks_per_s'] or 0:>10.1f} tracks/s  {requests}")
+    return result
+
+
+def run_benchmarks(server, sizes, workers_list, playlists, rate_limit_every):
+    # Imported here: the endpoints are read from the environment at import time
+    from main import spotify_utils
+    from main.export_spotify_tracks_wrapped import build_wrapped_full
+
+    results = []
+    rng = random.Random(0)
+    wrapped = [
+        {"name": f"Person {i + 1}", "url": f"https://open.spotify.com/playlist/synthetic{rng.randint(50, 400)}"}
+        for i in range(playlists)
+    ]
+    cache_dir = spotify_utils.PLAYLIST_CACHE_DIR
+
+    def cold():
+        spotify_utils._meta.clear()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    for throttle in ([0, rate_limit_every] if rate_limit_every else [0]):
+        server.rate_limit_every = throttle
+        suffix = f" (429 every {throttle})" if throttle else ""
+        for workers in workers_list:
+            for size in sizes:
+                url = f"https://open.spotify.com/playlist/synthetic{size}"
+                cold()
+                results.append(_run(
+                    server, f"get_playlist_tracks n={size} workers={workers}{suffix}",
+                    lambda: len(spotify_utils.get_playlist_tracks(url, workers=workers)),
+                ))
+            cold()
+            results.append(_run(
+                server, f"wrapped x{playlists} cold workers={workers}{suffix}",
+                lambda: len(build_wrapped_full(wrapped, workers=workers)),
+            ))
+            spotify_utils._meta.clear()
+            results.append(_run(
+                server, f"wrapped x{playlists} warm workers={workers}{suffix}",
+                lambda: len(build_wrapped_full(wrapped, workers=workers)),
+            ))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Spotify fetching against a local fake API.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds added to every API request")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000], help="Single playlist sizes")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8], help="Worker counts to compare")
+    parser.add_argument("--playlists", type=int, default=30, help="Playlists in the wrapped run")
+    parser.add_argument("--rate-limit-every", type=int, default=25, help="Also run with every Nth request throttled (0: skip)")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args()
+    # spotipy logs every 429 as an error; here they are expected
+    logging.getLogger("spotipy").setLevel(logging.CRITICAL)
+
+    server = FakeSpotifyServer(latency=args.latency, retry_after=args.retry_after).start()
+    cache_dir = tempfile.mkdtemp(prefix="bench_fetch_")
+    os.environ.update({
+        "SPOTIFY_API_PREFIX": server.api_prefix,
+        "SPOTIFY_TOKEN_URL": server.token_url,
+        "SPOTIFY_CLIENT_ID": "bench",
+        "SPOTIFY_CLIENT_SECRET": "bench",
+        "PLAYLIST_CACHE_DIR": os.path.join(cache_dir, "playlists"),
+    })
+    print(f"Fake Spotify API on {server.api_prefix}, latency {args.latency:.3f} s")
+    try:
+        results = run_benchmarks(server, args.sizes, args.workers, args.playlists, args.rate_limit_every)
+    finally:
+        server.stop()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"latency": args.latency, "results": results}, f, indent=2)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
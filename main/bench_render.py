@@ -0,0 +1,288 @@
+"""Measure card rendering throughput on synthetic decks, offline.
+
+Builds decks of N made-up tracks (titles and artists of tunable length, a
+share of them in accented Latin, Greek, Cyrillic or CJK script, and
+optionally long comma-joined `name` fields in place of the year, like the
+wrapped deck) and runs the real pipeline steps on them:
+
+- `qr`: the QR side PDF (`create_pdf_with_qr_images`)
+- `text`: the text side PDF (`create_pdf_with_text_images`)
+- `pngs`: every card as PNG (`render_cards`, as `export_card_pngs` does)
+- `duplex`: both sides in one pass (`create_duplex_pdfs`), per output mode
+- `combine`: interleave the duplex PDFs (`combine_duplex`), per output mode
+
+Every step runs in a fresh process, so peak memory is that step's own and
+no fonts or templates stay warm between steps. The render cache is off and
+all output goes to a temporary directory; no network or Spotify credentials
+are needed.
+
+For each step it reports cards per second, peak RSS (of the step process
+and of its render workers; not available on Windows), output bytes per card and the per-stage
+breakdown from `main.profiling`. `--json` saves the results; `--baseline`
+compares against a saved run and exits with status 1 when a step got
+slower than `--tolerance`.
+
+Usage:
+    python main/bench_render.py
+    python main/bench_render.py --sizes 10 100 1000 10000 --modes raster vector --json render.json
+    python main/bench_render.py --steps duplex --modes vector --baseline render.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS of the render workers
+    resource = None
+
+# make repo root importable like other scripts
+_repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _repo_root not in sys.path:
+    sys.path.insert(0, _repo_root)
+
+STEPS = ("qr", "text", "pngs", "duplex", "combine")
+# Steps whose output depends on PDF_OUTPUT_MODE; the others always rasterise
+MODE_STEPS = ("duplex", "combine")
+_ID_CHARS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+_WORDS = (
+    "love night dance heart summer fire dream gold blue road light rain "
+    "wild river city star home time girl boy baby money party ocean moon"
+).split()
+_UNICODE_WORDS = (
+    "Beyoncé Mötley Crüe Björk Sigur Rós Ça plaît Señorita Niño Straße Øresund "
+    "Αθήνα νύχτα Москва ночь Звезда 東京 夜 愛 서울 Ærø Łódź"
+).split()
+_NAMES = "Anna Bram Charlotte Daan Eva Floor Gijs Hanna Ilse Joris Kim Lotte Mees Noor".split()
+
+
+def synthetic_deck(n, title_words=(1, 4), artist_words=(1, 3), unicode_share=0.2, names=0, seed=0):
+    """Return `n` track dicts with random titles, artists and URLs.
+
+    Word counts are drawn from the `(min, max)` ranges; `unicode_share` of the
+    words come from non-ASCII scripts. With `names` > 0 the year is replaced
+    by that many comma-joined person names, as in the wrapped deck.
+    """
+    rng = random.Random(seed)
+
+    def words(lo, hi):
+        return " ".join(
+            rng.choice(_UNICODE_WORDS) if rng.random() < unicode_share else rng.choice(_WORDS).title()
+            for _ in range(rng.randint(lo, hi))
+        )
+
+    tracks = []
+    for _ in range(n):
+        track = {
+            "title": words(*title_words),
+            "artist": words(*artist_words),
+            "album": words(1, 3),
+            "year": str(rng.randint(1950, 2024)),
+            "url": "https://open.spotify.com/track/" + "".join(rng.choice(_ID_CHARS) for _ in range(22)),
+        }
+        if names:
+            track["name"] = ", ".join(rng.sample(_NAMES, min(names, len(_NAMES))))
+            track["year"] = track["name"]
+        tracks.append(track)
+    return tracks
+
+
+def _paths(work_dir, mode):
+    return {
+        "qr": os.path.join(work_dir, f"qr_{mode}.pdf"),
+        "text": os.path.join(work_dir, f"text_{mode}.pdf"),
+        "combined": os.path.join(work_dir, f"combined_{mode}.pdf"),
+        "pngs": os.path.join(work_dir, "pngs"),
+    }
+
+
+def _dir_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def run_step(step, deck_path, mode, workers, work_dir):
+    """Run one step in this process and return its measurements (called in the child process)."""
+    from main import profiling
+    from main.card_renderer import CardRenderer, card_png_path
+    from main.combine_pdfs import combine_duplex
+    from main.duplex import create_duplex_pdfs
+    from main.qr_on_bg import create_pdf_with_qr_images, create_qr_on_bg
+    from main.render_pool import render_cards
+    from main.text_on_bg import create_pdf_with_text_images, create_text_on_bg
+
+    with open(deck_path, "r", encoding="utf-8") as f:
+        tracks = json.load(f)
+    paths = _paths(work_dir, mode)
+
+    if step == "combine" and not (os.path.exists(paths["qr"]) and os.path.exists(paths["text"])):
+        # Inputs from the duplex step; build them untimed when it was skipped
+        # (peak RSS then includes that build)
+        create_duplex_pdfs(tracks, paths["qr"], paths["text"], workers=workers, output_mode=mode)
+
+    profiling.enable(write_at_exit=False)
+    start = time.perf_counter()
+    if step == "combine":
+        combine_duplex(paths["text"], paths["qr"], paths["combined"])
+        outputs = [paths["combined"]]
+    else:
+        renderer = CardRenderer()
+        if step == "qr":
+            create_pdf_with_qr_images(tracks, paths["qr"], renderer, workers)
+            outputs = [paths["qr"]]
+        elif step == "text":
+            create_pdf_with_text_images(tracks, paths["text"], renderer, workers)
+            outputs = [paths["text"]]
+        elif step == "pngs":
+            os.makedirs(paths["pngs"], exist_ok=True)
+            render_cards(create_qr_on_bg, [(t["url"], card_png_path(paths["pngs"], i, "qr_back")) for i, t in enumerate(tracks)], renderer, workers)
+            render_cards(create_text_on_bg, [(t, card_png_path(paths["pngs"], i, "text_front")) for i, t in enumerate(tracks)], renderer, workers)
+            outputs = [paths["pngs"]]
+        else:
+            create_duplex_pdfs(tracks, paths["qr"], paths["text"], renderer=renderer, workers=workers, output_mode=mode)
+            outputs = [paths["qr"], paths["text"]]
+    wall = time.perf_counter() - start
+
+    report = profiling.report()
+    children = None
+    if resource is not None:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        if sys.platform == "darwin":
+            children //= 1024
+    output_bytes = sum(_dir_bytes(p) if os.path.isdir(p) else os.path.getsize(p) for p in outputs)
+    return {
+        "wall_s": round(wall, 3),
+        "peak_rss_mb": report["peak_rss_mb"],
+        "workers_peak_rss_mb": round(children / 1024, 1) if children else None,
+        "output_bytes": output_bytes,
+        "stages": report["stages"],
+    }
+
+
+def _run_case(step, n, mode, workers, deck_path, work_dir):
+    env = dict(os.environ, RENDER_CACHE_DIR="", PROFILE="", PROFILE_STAGE="")
+    cmd = [sys.executable, os.path.abspath(__file__), "--case", step, deck_path, mode, str(workers), work_dir]
+    proc = subprocess.run(cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise RuntimeError(f"Step {step} n={n} mode={mode} failed (exit {proc.returncode})")
+    # The step's own prints come first; the measurements are the last line
+    result = {"step": step, "n": n, "mode": mode, "workers": workers}
+    result.update(json.loads(proc.stdout.strip().splitlines()[-1]))
+    result["cards_per_s"] = round(n / result["wall_s"], 2) if result["wall_s"] else None
+    result["bytes_per_card"] = round(result["output_bytes"] / n) if n else None
+    top = ", ".join(f"{name} {s['wall_s']:.2f}s" for name, s in list(result["stages"].items())[:3])
+    rss = f"{result['peak_rss_mb']:.1f}" if result["peak_rss_mb"] is not None else "-"
+    print(f"{step:<8} n={n:<6} {mode:<8} workers={workers:<3} {result['wall_s']:>9.2f} s {result['cards_per_s'] or 0:>9.2f} cards/s "
+          f"{result['bytes_per_card'] or 0:>9} B/card {rss:>7} MB  {top}")
+    return result
+
+
+def run_benchmarks(sizes, modes, steps, workers_list, deck_options, tmp_dir):
+    results = []
+    for n in sizes:
+        deck_path = os.path.join(tmp_dir, f"deck_{n}.json")
+        with open(deck_path, "w", encoding="utf-8") as f:
+            json.dump(synthetic_deck(n, **deck_options), f, ensure_ascii=False)
+        for workers in workers_list:
+            work_dir = os.path.join(tmp_dir, f"n{n}_w{workers}")
+            os.makedirs(work_dir, exist_ok=True)
+            for step in steps:
+                for mode in (modes if step in MODE_STEPS else ["raster"]):
+                    results.append(_run_case(step, n, mode, workers, deck_path, work_dir))
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def _key(result):
+    return (result["step"], result["n"], result["mode"], result["workers"])
+
+
+def compare(results, baseline, tolerance):
+    """Print each result against the same run in `baseline`; return the runs slower than `tolerance`."""
+    old = {_key(r): r for r in baseline["results"]}
+    regressions = []
+    print(f"\nCompared with baseline from {baseline.get('created', '?')}:")
+    for r in results:
+        b = old.get(_key(r))
+        label = f"{r['step']:<8} n={r['n']:<6} {r['mode']:<8} workers={r['workers']:<3}"
+        if b is None or not b.get("cards_per_s") or not r.get("cards_per_s"):
+            print(f"{label} (no baseline)")
+            continue
+        speed = r["cards_per_s"] / b["cards_per_s"] - 1
+        size = r["bytes_per_card"] / b["bytes_per_card"] - 1 if b.get("bytes_per_card") else 0.0
+        mark = ""
+        if speed < -tolerance:
+            mark = "  ❌ slower"
+            regressions.append(r)
+        elif speed > tolerance:
+            mark = "  ✅ faster"
+        print(f"{label} {b['cards_per_s']:>9.2f} -> {r['cards_per_s']:>9.2f} cards/s ({speed:+.0%}), "
+              f"{b['bytes_per_card']} -> {r['bytes_per_card']} B/card ({size:+.0%}){mark}")
+    return regressions
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--case":
+        # Child process: run one step and print its measurements as JSON
+        step, deck_path, mode, workers, work_dir = sys.argv[2:7]
+        result = run_step(step, deck_path, mode, int(workers), work_dir)
+        print(json.dumps(result))
+        return
+
+    parser = argparse.ArgumentParser(description="Benchmark card rendering on synthetic decks.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Deck sizes (add 10000 for the full suite)")
+    parser.add_argument("--modes", nargs="+", default=["raster", "overlay", "vector"], help="PDF output modes for duplex/combine")
+    parser.add_argument("--steps", nargs="+", default=list(STEPS), choices=STEPS, help="Steps to run")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0], help="Render worker counts (0: RENDER_WORKERS / all CPUs)")
+    parser.add_argument("--title-words", type=int, nargs=2, default=[1, 4], metavar=("MIN", "MAX"))
+    parser.add_argument("--artist-words", type=int, nargs=2, default=[1, 3], metavar=("MIN", "MAX"))
+    parser.add_argument("--unicode-share", type=float, default=0.2, help="Share of non-ASCII words")
+    parser.add_argument("--names", type=int, default=0, help="Comma-joined person names in place of the year (wrapped deck)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with results saved by an earlier --json run")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative cards/s drop reported as a regression")
+    args = parser.parse_args()
+
+    deck_options = {
+        "title_words": tuple(args.title_words),
+        "artist_words": tuple(args.artist_words),
+        "unicode_share": args.unicode_share,
+        "names": args.names,
+        "seed": args.seed,
+    }
+    tmp_dir = tempfile.mkdtemp(prefix="bench_render_")
+    try:
+        results = run_benchmarks(args.sizes, args.modes, args.steps, args.workers, deck_options, tmp_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    data = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "deck": deck_options,
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        print(f"Wrote {args.json}")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Shared template and font state for rendering card faces.
+
+Every card of a deck starts from the same background PNG with the same white
+cutting outline, and uses the same handful of fonts. `CardRenderer` decodes
+each background once, draws the outline on it, and hands out cheap copies so
+the per-card work is only the QR code or the text.
+
+Usage:
+- Create one `CardRenderer()` per deck and pass it to `create_qr_on_bg`,
+  `create_text_on_bg` or the PDF builders.
+- Or call `get_renderer()` to share a process-wide default instance.
+
+Templates are resampled once to the card's print size at `CARD_DPI` and
+flattened to RGB unless they have real transparency, so every card is drawn
+on exactly the pixels the printer needs.
+
+Faces are looked up in the on-disk render cache (`main.render_cache`) before
+being drawn; `face_key` builds their keys from the template's file hash, the
+DPI and the inputs each side passes in.
+"""
+import os
+from PIL import Image, ImageDraw
+from main.config import CARD_DPI, CARD_SIZE_CM, QR_BG_IMAGE, TEXT_BG_IMAGE
+from main.fonts import get_font
+from main.overlays import ImageOverlay
+from main.render_cache import cache_key, default_render_cache, file_digest
+
+
+def draw_cut_outline(img):
+    """Draw the white cutting outline along the edge of `img` in place."""
+    W, H = img.size
+    outline_width = max(2, W//100)  # At least 2px, scale with image size
+    outline_draw = ImageDraw.Draw(img)
+    outline_draw.rectangle([(outline_width//2, outline_width//2), (W-outline_width//2-1, H-outline_width//2-1)], outline="white", width=outline_width)
+
+
+def card_pixels(dpi=CARD_DPI, card_size_cm=CARD_SIZE_CM):
+    """Return the width in pixels of a card printed at `dpi`."""
+    return max(1, round(card_size_cm / 2.54 * dpi))
+
+
+def load_template(path, dpi=CARD_DPI):
+    """Decode the template at `path`, resampled to the card width at `dpi` (0: as is).
+
+    The result is RGB, or RGBA when the file has pixels that are actually
+    transparent.
+    """
+    with Image.open(path) as im:
+        if im.mode in ("RGBA", "LA", "PA") or "transparency" in im.info:
+            template = im.convert("RGBA")
+            if template.getextrema()[3][0] == 255:
+                template = template.convert("RGB")
+        else:
+            template = im.convert("RGB")
+    if dpi:
+        W, H = template.size
+        width = card_pixels(dpi)
+        size = (width, max(1, round(H * width / W)))
+        if size != template.size:
+            template = template.resize(size, Image.LANCZOS)
+    return template
+
+
+def card_png_path(png_dir, index, suffix):
+    """Return the PNG path of card `index` (0-based), e.g. `003_qr_back.png` for index 2."""
+    return os.path.join(png_dir, f"{index+1:03d}_{suffix}.png")
+
+
+def save_card_pngs(images, png_dir, suffix):
+    """Save cards as `{png_dir}/{NNN}_{suffix}.png` (1-based, like `export_card_pngs`) while passing them on.
+
+    This is a generator: each image is saved and yielded as it arrives, so it
+    can sit in a streaming pipeline without holding the whole deck.
+    """
+    os.makedirs(png_dir, exist_ok=True)
+    for idx, img in enumerate(images):
+        img.save(card_png_path(png_dir, idx, suffix))
+        yield img
+
+
+class CardRenderer:
+    """Holds the decoded card templates and loaded fonts for one deck."""
+
+    def __init__(self, qr_bg_image=QR_BG_IMAGE, text_bg_image=TEXT_BG_IMAGE, cache=None, dpi=CARD_DPI):
+        self.qr_bg_image = qr_bg_image
+        self.text_bg_image = text_bg_image
+        self.dpi = dpi
+        self._templates = {}
+        self._digests = {}
+        # None: use the configured render cache; False: no caching
+        self.cache = default_render_cache() if cache is None else (cache or None)
+
+    def _template(self, path):
+        template = self._templates.get(path)
+        if template is None:
+            template = load_template(path, self.dpi)
+            draw_cut_outline(template)
+            self._templates[path] = template
+        return template
+
+    def qr_template(self):
+        """Return the shared QR side template; do not draw on it."""
+        return self._template(self.qr_bg_image)
+
+    def text_template(self):
+        """Return the shared text side template; do not draw on it."""
+        return self._template(self.text_bg_image)
+
+    def qr_background(self):
+        """Return a fresh copy of the QR side template (outline included)."""
+        return self.qr_template().copy()
+
+    def text_background(self):
+        """Return a fresh copy of the text side template (outline included)."""
+        return self.text_template().copy()
+
+    def font(self, size, bold=False, italic=False):
+        # Fonts are shared through the LRU cache in `main.fonts`
+        return get_font(size, bold=bold, italic=italic)
+
+    def template_digest(self, path):
+        """Return the SHA-256 of the template file at `path`, hashed once per renderer."""
+        digest = self._digests.get(path)
+        if digest is None:
+            digest = self._digests[path] = file_digest(path)
+        return digest
+
+    def face_key(self, kind, template_path, **inputs):
+        """Return the render cache key of a face drawn on `template_path`, or None without a cache."""
+        if self.cache is None:
+            return None
+        return cache_key(kind, template=self.template_digest(template_path), card_size_cm=CARD_SIZE_CM, dpi=self.dpi, **inputs)
+
+    def cached_card(self, key, render):
+        """Return the cached card image for `key`, rendering and storing it on a miss."""
+        if key is None:
+            return render()
+        return self.cache.image(key, render)
+
+    def save_cached_card(self, key, render, out_path):
+        """Write the card for `key` to `out_path` as PNG, reusing a cached file when possible."""
+        if key is None:
+            render().save(out_path)
+            return out_path
+        return self.cache.save_image(key, render, out_path)
+
+    def cached_overlay(self, key, render):
+        """Return the cached `ImageOverlay` for `key`, rendering and storing it on a miss."""
+        if key is None:
+            return render()
+        return self.cache.object(key, render, ImageOverlay.to_bytes, ImageOverlay.from_bytes)
+
+
+_default_renderer = None
+
+
+def get_renderer():
+    """Return the process-wide default `CardRenderer`, creating it on first use."""
+    global _default_renderer
+    if _default_renderer is None:
+        _default_renderer = CardRenderer()
+    return _default_renderer
@@ -0,0 +1,392 @@
+"""Local SQLite catalogue of every synced playlist.
+
+The per-playlist JSON files in `playlist_list/` stay the files people edit
+and commit; the catalogue (`CATALOGUE_DB`) holds the same data in indexed
+tables so syncs only write what changed and readers can query instead of
+loading whole files:
+
+- `tracks`: one row per Spotify URL with the metadata as last fetched;
+- `playlists`: slug, Spotify id/name/snapshot and the digest of the JSON file
+  as last imported or exported;
+- `memberships`: a track on a playlist, with its position, the person `name`
+  and `ord` of wrapped lists, the card text where it differs from `tracks`
+  (hand-edited titles, years) and the entry's key order;
+- `review`: whether the card of a playlist entry has been checked, keyed on
+  the entry's position like `memberships`, so a URL listed twice has a flag
+  per card.
+
+Every write is one transaction, so an interrupted sync leaves the previous
+state. When a JSON file changes outside the catalogue (a hand edit), the next
+read re-imports it, so the file always wins over stale rows.
+
+Usage:
+    tracks = load_tracks("carnavalskrakers")
+    with Catalogue() as cat:
+        cat.tracks("oud_en_nieuw_hitster", checked=False)
+        cat.set_checked("oud_en_nieuw_hitster", position)  # index in cat.tracks(...)
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from main.atomic_files import atomic_write
+from main.config import CATALOGUE_DB, SPOTIFY_TRACKS_JSON_TEMPLATE
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    url TEXT PRIMARY KEY,
+    title TEXT,
+    artist TEXT,
+    album TEXT,
+    year TEXT
+);
+CREATE TABLE IF NOT EXISTS playlists (
+    slug TEXT PRIMARY KEY,
+    playlist_id TEXT,
+    name TEXT,
+    snapshot_id TEXT,
+    json_digest TEXT,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS memberships (
+    playlist TEXT NOT NULL REFERENCES playlists(slug) ON DELETE CASCADE,
+    url TEXT NOT NULL REFERENCES tracks(url),
+    name TEXT NOT NULL DEFAULT '',
+    position INTEGER NOT NULL,
+    ord INTEGER,
+    title TEXT,
+    artist TEXT,
+    album TEXT,
+    year TEXT,
+    fields TEXT NOT NULL,
+    extra TEXT,
+    PRIMARY KEY (playlist, position)
+);
+CREATE INDEX IF NOT EXISTS memberships_url ON memberships(url);
+CREATE TABLE IF NOT EXISTS review (
+    playlist TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    checked INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL,
+    PRIMARY KEY (playlist, position),
+    FOREIGN KEY (playlist, position) REFERENCES memberships(playlist, position)
+        ON DELETE CASCADE ON UPDATE CASCADE
+);
+CREATE INDEX IF NOT EXISTS review_checked ON review(playlist, checked);
+"""
+# Bump when SCHEMA changes incompatibly; older catalogues are rebuilt from the JSON files
+SCHEMA_VERSION = 3
+
+# Card text columns shared by `tracks` and `memberships`
+TEXT_FIELDS = ("title", "artist", "album", "year")
+# Entry keys with a column of their own; anything else goes to `extra`
+KNOWN_FIELDS = TEXT_FIELDS + ("url", "checked", "name", "order")
+
+
+def json_path_for(playlist_slug):
+    return SPOTIFY_TRACKS_JSON_TEMPLATE.format(playlist_slug=playlist_slug)
+
+
+def slug_for(json_path):
+    """Return the playlist slug of a `spotify_tracks_<slug>.json` path."""
+    base = os.path.splitext(os.path.basename(json_path))[0]
+    return base[len("spotify_tracks_"):] if base.startswith("spotify_tracks_") else base
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _dump(tracks):
+    # Same formatting as the JSON files have always had
+    return json.dumps(tracks, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+class Catalogue:
+    """A connection to the catalogue database; use as a context manager."""
+
+    def __init__(self, path=CATALOGUE_DB):
+        self.path = path
+        if path != ":memory:":
+            out_dir = os.path.dirname(path)
+            if out_dir:
+                os.makedirs(out_dir, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        # WAL: readers are not blocked by a sync and a crash never leaves a half-written file
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        with self.conn:
+            self._migrate()
+            self.conn.executescript(SCHEMA)
+
+    def _migrate(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version == SCHEMA_VERSION:
+            return
+        kept = []
+        if version == 2:
+            # Version 2 keyed review state on (playlist, url); every entry of
+            # a URL keeps the state the URL had
+            kept = self.conn.execute(
+                """SELECT m.playlist, m.position, r.checked, r.updated_at
+                   FROM memberships m JOIN review r ON r.playlist = m.playlist AND r.url = m.url"""
+            ).fetchall()
+        else:
+            # Version 1 keyed memberships on (playlist, url, name), which merged
+            # repeated entries such as several manual tracks without a URL. The
+            # JSON files hold every entry, so drop the table and let the next
+            # read of each playlist re-import its file.
+            self.conn.execute("DROP TABLE IF EXISTS memberships")
+            if self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'playlists'").fetchone():
+                self.conn.execute("UPDATE playlists SET json_digest = NULL")
+        self.conn.execute("DROP TABLE IF EXISTS review")
+        self.conn.executescript(SCHEMA)
+        self.conn.executemany("INSERT INTO review (playlist, position, checked, updated_at) VALUES (?, ?, ?, ?)", kept)
+        self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    # Playlists
+
+    def playlists(self):
+        return [row["slug"] for row in self.conn.execute("SELECT slug FROM playlists ORDER BY slug")]
+
+    def playlist(self, slug):
+        row = self.conn.execute("SELECT * FROM playlists WHERE slug = ?", (slug,)).fetchone()
+        return dict(row) if row else None
+
+    def _upsert_playlist(self, slug, playlist_id=None, name=None, snapshot_id=None):
+        self.conn.execute(
+            """INSERT INTO playlists (slug, playlist_id, name, snapshot_id, updated_at) VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(slug) DO UPDATE SET
+                   playlist_id = COALESCE(excluded.playlist_id, playlist_id),
+                   name = COALESCE(excluded.name, name),
+                   snapshot_id = COALESCE(excluded.snapshot_id, snapshot_id),
+                   updated_at = excluded.updated_at""",
+            (slug, playlist_id, name, snapshot_id, time.time()),
+        )
+
+    # Tracks
+
+    def tracks(self, slug, checked=None):
+        """Return a playlist's entries in the JSON file format, in order.
+
+        `checked=False` (or True) returns only the entries whose card has not
+        (or has) been checked.
+        """
+        query = """
+            SELECT m.*, r.checked,
+                   t.title AS t_title, t.artist AS t_artist, t.album AS t_album, t.year AS t_year
+            FROM memberships m
+            JOIN tracks t ON t.url = m.url
+            LEFT JOIN review r ON r.playlist = m.playlist AND r.position = m.position
+            WHERE m.playlist = ?"""
+        params = [slug]
+        if checked is not None:
+            query += " AND COALESCE(r.checked, 0) = ?"
+            params.append(int(bool(checked)))
+        query += " ORDER BY m.position"
+        return [self._entry(row) for row in self.conn.execute(query, params)]
+
+    @staticmethod
+    def _entry(row):
+        extra = json.loads(row["extra"]) if row["extra"] else {}
+        values = {
+            "url": row["url"],
+            "checked": bool(row["checked"]),
+            "name": row["name"],
+            "order": row["ord"],
+        }
+        for field in TEXT_FIELDS:
+            value = row[field]
+            values[field] = value if value is not None else row["t_" + field]
+        entry = {}
+        for key in json.loads(row["fields"]):
+            entry[key] = values[key] if key in values else extra.get(key)
+        return entry
+
+    def import_tracks(self, slug, tracks, json_digest=None):
+        """Replace a playlist's entries with `tracks` (JSON file format) in one transaction."""
+        with self.conn:
+            self._upsert_playlist(slug)
+            self.conn.execute("DELETE FROM memberships WHERE playlist = ?", (slug,))
+            self.conn.execute("DELETE FROM review WHERE playlist = ?", (slug,))
+            self._insert(slug, tracks, 0)
+            self.conn.execute("UPDATE playlists SET json_digest = ? WHERE slug = ?", (json_digest, slug))
+
+    def _insert(self, slug, tracks, start):
+        now = time.time()
+        track_rows, member_rows, review_rows = [], [], []
+        for position, t in enumerate(tracks, start):
+            url = t.get("url") or ""
+            track_rows.append((url,) + tuple(t.get(f) for f in TEXT_FIELDS))
+            extra = {k: v for k, v in t.items() if k not in KNOWN_FIELDS}
+            member_rows.append((
+                slug, url, t.get("name") or "", position, t.get("order"),
+                *(t.get(f) for f in TEXT_FIELDS),
+                json.dumps(list(t)), json.dumps(extra, ensure_ascii=False) if extra else None,
+            ))
+            if "checked" in t:
+                review_rows.append((slug, position, int(bool(t["checked"])), now))
+        # The first version of a URL seen becomes the catalogue's metadata
+        self.conn.executemany(
+            "INSERT INTO tracks (url, title, artist, album, year) VALUES (?, ?, ?, ?, ?) ON CONFLICT(url) DO NOTHING",
+            track_rows,
+        )
+        self.conn.executemany(
+            "INSERT INTO memberships (playlist, url, name, position, ord, title, artist, album, year, fields, extra)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            member_rows,
+        )
+        self._strip_card_text({row[1] for row in member_rows})
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO review (playlist, position, checked, updated_at) VALUES (?, ?, ?, ?)",
+            review_rows,
+        )
+
+    def add_tracks(self, slug, tracks, playlist_id=None, name=None, snapshot_id=None):
+        """Merge freshly fetched tracks into a playlist and return how many were new.
+
+        Tracks whose URL the playlist already has are left as they are (so
+        hand edits survive); new ones are added unchecked. Entries without a
+        review state count as checked, and the playlist is kept ordered by
+        title, as the exporter has always done.
+        """
+        with self.conn:
+            self._upsert_playlist(slug, playlist_id, name, snapshot_id)
+            existing = {row["url"] for row in self.conn.execute("SELECT url FROM memberships WHERE playlist = ?", (slug,))}
+            new = []
+            for t in tracks:
+                url = t.get("url")
+                if url not in existing:
+                    existing.add(url)
+                    new.append(dict(t, checked=False))
+            fetched = {t.get("url") or "" for t in tracks}
+            # Every playlist holding these URLs keeps the card text it has now
+            self._pin_card_text(fetched)
+            # Refresh the Spotify metadata of every fetched track
+            self.conn.executemany(
+                """INSERT INTO tracks (url, title, artist, album, year) VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(url) DO UPDATE SET title = excluded.title, artist = excluded.artist,
+                       album = excluded.album, year = excluded.year""",
+                [(t.get("url") or "",) + tuple(t.get(f) for f in TEXT_FIELDS) for t in tracks],
+            )
+            self._strip_card_text(fetched)
+            start = self.conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM memberships WHERE playlist = ?", (slug,)).fetchone()[0]
+            self._insert(slug, new, start)
+            # Ensure all tracks have checked field (assume old tracks are checked)
+            self.conn.execute(
+                """INSERT OR IGNORE INTO review (playlist, position, checked, updated_at)
+                   SELECT playlist, position, 1, ? FROM memberships WHERE playlist = ?""",
+                (time.time(), slug),
+            )
+            self.conn.execute(
+                """UPDATE memberships SET fields = json_insert(fields, '$[#]', 'checked')
+                   WHERE playlist = ? AND NOT EXISTS (SELECT 1 FROM json_each(fields) WHERE value = 'checked')""",
+                (slug,),
+            )
+            self._sort_by_title(slug)
+        return len(new)
+
+    def _pin_card_text(self, urls):
+        # Before the metadata of `urls` changes, store the current card text on
+        # every membership of those URLs (in any playlist), so existing cards
+        # keep the text they had
+        for field in TEXT_FIELDS:
+            self.conn.executemany(
+                f"""UPDATE memberships SET {field} = (SELECT {field} FROM tracks WHERE tracks.url = memberships.url)
+                    WHERE url = ? AND {field} IS NULL""",
+                [(url,) for url in urls],
+            )
+
+    def _strip_card_text(self, urls):
+        # Keep only the card text that differs from the track's metadata
+        for field in TEXT_FIELDS:
+            self.conn.executemany(
+                f"""UPDATE memberships SET {field} = NULL
+                    WHERE url = ? AND {field} IS (SELECT {field} FROM tracks WHERE tracks.url = memberships.url)""",
+                [(url,) for url in urls],
+            )
+
+    def _sort_by_title(self, slug):
+        rows = self.conn.execute(
+            """SELECT m.rowid, m.position, COALESCE(m.title, t.title, '') AS title
+               FROM memberships m JOIN tracks t ON t.url = m.url
+               WHERE m.playlist = ? ORDER BY m.position""",
+            (slug,),
+        ).fetchall()
+        # Stable, like list.sort: equal titles keep their order
+        ordered = sorted(rows, key=lambda row: row["title"].lower())
+        moves = [(position, row["rowid"]) for position, row in enumerate(ordered) if row["position"] != position]
+        # Positions are the key: park the moved rows on negative ones first so
+        # no two rows ever share a position (review rows follow via ON UPDATE CASCADE)
+        self.conn.executemany("UPDATE memberships SET position = -1 - ? WHERE rowid = ?", moves)
+        self.conn.executemany("UPDATE memberships SET position = ? WHERE rowid = ?", moves)
+
+    def set_checked(self, slug, position, checked=True):
+        """Mark the card of the entry at `position` (its index in `tracks(slug)`) as checked or not."""
+        with self.conn:
+            self.conn.execute(
+                """INSERT INTO review (playlist, position, checked, updated_at) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(playlist, position) DO UPDATE SET checked = excluded.checked, updated_at = excluded.updated_at""",
+                (slug, position, int(bool(checked)), time.time()),
+            )
+
+    # JSON files
+
+    def import_json(self, json_path, slug=None):
+        """Load a `spotify_tracks_*.json` file into the catalogue, replacing the playlist's entries."""
+        with open(json_path, "rb") as f:
+            data = f.read()
+        self.import_tracks(slug or slug_for(json_path), json.loads(data), json_digest=_digest(data))
+
+    def refresh_from_json(self, slug, json_path=None):
+        """Re-import the playlist's JSON file if it changed since the catalogue last read or wrote it."""
+        json_path = json_path or json_path_for(slug)
+        try:
+            with open(json_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return False
+        digest = _digest(data)
+        known = self.playlist(slug)
+        if known and known["json_digest"] == digest:
+            return False
+        self.import_tracks(slug, json.loads(data), json_digest=digest)
+        return True
+
+    def export_json(self, slug, json_path=None):
+        """Write the playlist to its JSON file (atomically) and return the number of entries."""
+        json_path = json_path or json_path_for(slug)
+        tracks = self.tracks(slug)
+        data = _dump(tracks)
+        out_dir = os.path.dirname(json_path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        atomic_write(json_path, data)
+        with self.conn:
+            self.conn.execute("UPDATE playlists SET json_digest = ? WHERE slug = ?", (_digest(data), slug))
+        return len(tracks)
+
+
+def load_tracks(playlist_slug, json_path=None, checked=None):
+    """Return a playlist's tracks from the catalogue, picking up edits to its JSON file first.
+
+    Raises FileNotFoundError when neither the catalogue nor the JSON file has the playlist.
+    """
+    json_path = json_path or json_path_for(playlist_slug)
+    with Catalogue() as cat:
+        cat.refresh_from_json(playlist_slug, json_path)
+        if cat.playlist(playlist_slug) is None:
+            raise FileNotFoundError(json_path)
+        return cat.tracks(playlist_slug, checked=checked)
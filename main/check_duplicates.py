@@ -1,121 +1,109 @@
-# Save and run as e.g. find_title_url_duplicates.py at repository root
-import json, os, sys
-import re
-from collections import defaultdict
-
-p = os.path.join("main", "playlist_list", "spotify_tracks_wrapped_full.json")
-if not os.path.exists(p):
-    print("File not found:", p)
-    sys.exit(1)
-
-with open(p, "r", encoding="utf-8") as f:
-    tracks = json.load(f)
-
-# Try rapidfuzz for better fuzzy matching, fall back to difflib
-try:
-    from rapidfuzz import fuzz
-    def similarity(a, b):
-        return fuzz.token_set_ratio(a, b)
-except Exception:
-    from difflib import SequenceMatcher
-    def similarity(a, b):
-        return int(SequenceMatcher(None, a, b).ratio() * 100)
-
-
-def normalize(s):
-    if not s:
-        return ""
-    s = s.lower()
-    # remove parenthetical/bracketed info like (remastered), [live], etc.
-    s = re.sub(r"[\(\[\{].*?[\)\]\}]", "", s)
-    # remove common suffixes/words that don't change identity
-    s = re.sub(r"\b(remastered|remaster|edit|live|version|single|mono|stereo)\b", "", s)
-    # strip punctuation, extra whitespace
-    s = re.sub(r"[^\w\s]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
-
-
-# Prepare normalized title/artist for each track
-items = []
-for t in tracks:
-    title = (t.get("title") or "").strip()
-    artist = (t.get("artist") or "").strip()
-    url = (t.get("url") or "").strip()
-    norm_title = normalize(title)
-    norm_artist = normalize(artist)
-    items.append({
-        "orig": t,
-        "title": title,
-        "artist": artist,
-        "url": url,
-        "norm_title": norm_title,
-        "norm_artist": norm_artist,
-    })
-
-n = len(items)
-# Disjoint set (union-find) for grouping fuzzy-equal tracks
-parent = list(range(n))
-def find(x):
-    while parent[x] != x:
-        parent[x] = parent[parent[x]]
-        x = parent[x]
-    return x
-def union(a, b):
-    ra, rb = find(a), find(b)
-    if ra != rb:
-        parent[rb] = ra
-
-# Thresholds (percent)
-TITLE_THRESH = 85
-ARTIST_THRESH = 75
-
-for i in range(n):
-    for j in range(i+1, n):
-        ti = items[i]["norm_title"]
-        tj = items[j]["norm_title"]
-        ai = items[i]["norm_artist"]
-        aj = items[j]["norm_artist"]
-
-        if not ti or not tj:
-            continue
-
-        title_sim = similarity(ti, tj)
-        artist_sim = similarity(ai, aj) if (ai or aj) else 100  # no artist -> be lenient
-
-        # Consider match if both title and artist similar enough,
-        # or title very similar even if artist slightly different.
-        if (title_sim >= TITLE_THRESH and artist_sim >= ARTIST_THRESH) or (title_sim >= 92 and artist_sim >= 60):
-            union(i, j)
-
-# Collect groups
-groups = defaultdict(list)
-for idx in range(n):
-    groups[find(idx)].append(items[idx])
-
-# Find groups where same (fuzzy) title+artist map to multiple URLs
-collisions = []
-for gid, group_items in groups.items():
-    urls = defaultdict(list)
-    for it in group_items:
-        urls[it["url"]].append(it)
-    if len(urls) > 1:
-        collisions.append((group_items, urls))
-
-if not collisions:
-    print("No fuzzy title+artist collisions with different URLs found.")
-else:
-    for group_items, urls in collisions:
+"""Report tracks that look like the same song but have different Spotify URLs.
+
+Titles and artists are normalized and compared fuzzily (see `main.dedupe`);
+each group of similar tracks that spans more than one URL is printed with the
+people, orders and spellings behind every URL.
+
+Usage:
+    python main/check_duplicates.py                 # spotify_tracks_wrapped_full.json
+    python main/check_duplicates.py --all           # every playlist_list/spotify_tracks_*.json together
+    python main/check_duplicates.py some.json other.json
+    python main/check_duplicates.py --verify        # also compare with the all-pairs scan
+
+rapidfuzz is used when installed (faster, token-order insensitive);
+otherwise difflib.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+# make repo root importable like other scripts
+_repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _repo_root not in sys.path:
+    sys.path.insert(0, _repo_root)
+
+from main.catalogue import Catalogue, json_path_for, load_tracks as load_playlist, slug_for
+from main.dedupe import find_collisions, find_duplicate_groups, pairwise_duplicate_groups
+
+PLAYLIST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "playlist_list")
+DEFAULT_FILE = os.path.join(PLAYLIST_DIR, "spotify_tracks_wrapped_full.json")
+
+
+def load_tracks(paths):
+    """Concatenate the tracks of the playlists behind `paths`, read through the catalogue."""
+    tracks = []
+    for p in paths:
+        try:
+            tracks.extend(load_playlist(slug_for(p), p))
+        except FileNotFoundError:
+            print("File not found:", p)
+            sys.exit(1)
+    return tracks
+
+
+def all_playlist_paths():
+    """Every playlist_list/spotify_tracks_*.json, plus playlists only the catalogue has."""
+    paths = sorted(glob.glob(os.path.join(PLAYLIST_DIR, "spotify_tracks_*.json")))
+    known = {slug_for(p) for p in paths}
+    with Catalogue() as cat:
+        paths += [json_path_for(slug) for slug in cat.playlists() if slug not in known]
+    return paths
+
+
+def print_collisions(tracks, collisions):
+    if not collisions:
+        print("No fuzzy title+artist collisions with different URLs found.")
+        return
+    for group, urls in collisions:
         # representative
-        rep_titles = sorted({it["title"] for it in group_items if it["title"]})
-        rep_artists = sorted({it["artist"] for it in group_items if it["artist"]})
+        titles = [(tracks[i].get("title") or "").strip() for i in group]
+        artists = [(tracks[i].get("artist") or "").strip() for i in group]
+        rep_titles = sorted({t for t in titles if t})
+        rep_artists = sorted({a for a in artists if a})
         print("====")
         print("REP TITLES:", rep_titles[:3])
         print("REP ARTISTS:", rep_artists[:3])
-        print(f"{len(group_items)} occurrences across {len(urls)} URLs")
-        for url, items_for_url in urls.items():
-            names = sorted({itm["orig"].get("name","") for itm in items_for_url})
-            orders = sorted({str(itm["orig"].get("order","")) for itm in items_for_url}, key=lambda x: int(x) if x.isdigit() else x)
-            variants = sorted({f'{itm["title"]} — {itm["artist"]}' for itm in items_for_url})
-            print(f"  - {url} occurrences={len(items_for_url)} names={names} orders={orders} variants={variants}")
-        print()
\ No newline at end of file
+        print(f"{len(group)} occurrences across {len(urls)} URLs")
+        for url, idxs in urls.items():
+            names = sorted({tracks[i].get("name", "") for i in idxs})
+            orders = sorted({str(tracks[i].get("order", "")) for i in idxs}, key=lambda x: int(x) if x.isdigit() else x)
+            variants = sorted({f'{(tracks[i].get("title") or "").strip()} — {(tracks[i].get("artist") or "").strip()}' for i in idxs})
+            print(f"  - {url} occurrences={len(idxs)} names={names} orders={orders} variants={variants}")
+        print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find fuzzy title+artist duplicates with different URLs.")
+    parser.add_argument("files", nargs="*", help=f"Track JSON files (default: {os.path.relpath(DEFAULT_FILE)})")
+    parser.add_argument("--all", action="store_true", help="Check every playlist_list/spotify_tracks_*.json together")
+    parser.add_argument("--verify", action="store_true", help="Also run the all-pairs scan and check the groups match")
+    args = parser.parse_args(argv)
+
+    paths = list(args.files)
+    if args.all:
+        paths += all_playlist_paths()
+    if not paths:
+        paths = [DEFAULT_FILE]
+    tracks = load_tracks(paths)
+
+    start = time.perf_counter()
+    groups = find_duplicate_groups(tracks)
+    elapsed = time.perf_counter() - start
+    print_collisions(tracks, find_collisions(tracks, groups))
+    print(f"Checked {len(tracks)} tracks from {len(paths)} file(s) in {elapsed:.2f} s", file=sys.stderr)
+
+    if args.verify:
+        start = time.perf_counter()
+        expected = pairwise_duplicate_groups(tracks)
+        elapsed = time.perf_counter() - start
+        if sorted(groups) == sorted(expected):
+            print(f"✅ Same groups as the all-pairs scan ({elapsed:.2f} s)", file=sys.stderr)
+        else:
+            print(f"❌ Groups differ from the all-pairs scan ({elapsed:.2f} s)", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
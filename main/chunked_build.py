@@ -0,0 +1,323 @@
+"""Checkpointed deck builds: render in page-sized chunks and resume after a failure.
+
+The deck is cut into chunks of `BUILD_CHUNK_PAGES` pages. Each chunk is
+built on its own (its own side PDFs, or its own PNGs) and, once its files
+are complete, gets a record `<kind>_NNNN.json` in the chunk directory with
+the hash of its inputs: the tracks it holds plus every setting that affects
+the output (templates, fonts, DPI, layout, output mode, encoding). The set
+of records is the build's manifest; `<kind>_manifest.json` next to them
+lists the planned chunks with their hashes and which are complete.
+
+A rerun skips every chunk whose record matches its current inputs, so it
+picks up at the first missing chunk, and editing one track only rebuilds
+the chunk holding it. The final PDFs are assembled from the chunk PDFs once
+all of them are complete. Chunks start on a page boundary, so a chunk PDF
+holds whole pages and assembling is plain page concatenation.
+
+Records are written atomically and per chunk, so separate processes (or
+machines sharing the output directory) can each build a page range:
+
+    python -m main render --pages 1-40     # on one box
+    python -m main render --pages 41-80    # on another
+    python -m main render                  # builds what is left and assembles
+
+Usage:
+    build_duplex_chunked(tracks, qr_pdf, text_pdf, chunk_dir, renderer=renderer)
+"""
+import json
+import os
+import shutil
+import time
+import hashlib
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, StreamObject
+from main.atomic_files import atomic_path, atomic_write
+from main.card_renderer import get_renderer
+from main.config import (
+    BUILD_CHUNK_PAGES, PDF_IMAGE_ENCODING, PDF_JPEG_QUALITY, PDF_OUTPUT_MODE, PDF_PAGE_COMPRESSION, QR_COMPACT_URLS,
+)
+from main.fonts import resolve_font_path
+from main.glow import GLOW_RADIUS
+from main.layout import PageLayout
+from main.render_cache import cache_key
+from main import profiling
+
+
+def parse_page_range(text):
+    """Parse "3", "3-7", "3-" or "-7" (1-based, inclusive) into `(first, last)`; None means open."""
+    if not text:
+        return None
+    first, sep, last = text.partition("-")
+    try:
+        first = int(first) if first else 1
+        last = int(last) if sep and last else (None if sep else first)
+    except ValueError:
+        raise ValueError(f"Invalid page range {text!r}; expected e.g. 3-7") from None
+    if first < 1 or (last is not None and last < first):
+        raise ValueError(f"Invalid page range {text!r}")
+    return first, last
+
+
+def render_settings(renderer, layout, **extra):
+    """Return everything besides the tracks that changes how a chunk renders (JSON-serialisable)."""
+    return dict(
+        templates=[renderer.template_digest(renderer.qr_bg_image), renderer.template_digest(renderer.text_bg_image)],
+        dpi=renderer.dpi,
+        fonts=[resolve_font_path(bold=True), resolve_font_path(italic=True)],
+        glow=GLOW_RADIUS,
+        qr_compact_urls=QR_COMPACT_URLS,
+        layout=[layout.cols, layout.rows, layout.card_w, layout.card_h, layout.page_w, layout.page_h, layout.margin_x, layout.margin_y],
+        pdf=[PDF_IMAGE_ENCODING, PDF_JPEG_QUALITY, PDF_PAGE_COMPRESSION],
+        **extra,
+    )
+
+
+def _track_inputs(track):
+    # The fields the card faces show
+    return [track["url"], track.get("title"), track.get("artist"), str(track.get("year"))]
+
+
+def _write_json(path, data):
+    atomic_write(path, json.dumps(data, indent=2))
+
+
+class Chunk:
+    """Cards `start:stop` of the deck, i.e. pages `first_page`..`last_page` (1-based)."""
+
+    def __init__(self, index, start, stop, per_page, key):
+        self.index = index
+        self.start = start
+        self.stop = stop
+        self.first_page = start // per_page + 1
+        self.last_page = (stop - 1) // per_page + 1
+        self.key = key
+
+    def in_pages(self, pages):
+        """Return whether the chunk overlaps the `(first, last)` page range (None: every page)."""
+        if pages is None:
+            return True
+        first, last = pages
+        return self.last_page >= first and (last is None or self.first_page <= last)
+
+
+class ChunkedBuild:
+    """The chunks of one deck output (`kind`, e.g. "duplex") and their records in `directory`."""
+
+    def __init__(self, directory, kind, tracks, settings, per_page, chunk_pages=None):
+        if chunk_pages is None:
+            chunk_pages = BUILD_CHUNK_PAGES
+        self.directory = directory
+        self.kind = kind
+        self.tracks = tracks
+        self.chunk_cards = max(1, chunk_pages) * per_page
+        self.chunks = []
+        for index, start in enumerate(range(0, len(tracks), self.chunk_cards)):
+            stop = min(start + self.chunk_cards, len(tracks))
+            key = cache_key(kind, settings=settings, start=start, tracks=[_track_inputs(t) for t in tracks[start:stop]])
+            self.chunks.append(Chunk(index, start, stop, per_page, key))
+
+    def chunk_path(self, chunk, suffix):
+        """Return the path of one of `chunk`'s files, e.g. `duplex_0003_qr.pdf`."""
+        return os.path.join(self.directory, f"{self.kind}_{chunk.index:04d}_{suffix}")
+
+    def _record_path(self, chunk):
+        return os.path.join(self.directory, f"{self.kind}_{chunk.index:04d}.json")
+
+    def is_done(self, chunk):
+        """Return whether `chunk` has a record for its current inputs and all of its files exist."""
+        try:
+            with open(self._record_path(chunk), "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return False
+        files = (os.path.join(self.directory, p) for p in record.get("files", []))
+        return record.get("key") == chunk.key and all(os.path.exists(p) for p in files)
+
+    def mark_done(self, chunk, files):
+        _write_json(self._record_path(chunk), {
+            "index": chunk.index,
+            "cards": [chunk.start, chunk.stop],
+            "pages": [chunk.first_page, chunk.last_page],
+            "key": chunk.key,
+            # Relative, so the directory can be shared under different mount points
+            "files": [os.path.relpath(p, self.directory) for p in files],
+            "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        })
+
+    def run(self, build_chunk, pages=None):
+        """Build every chunk in `pages` that is not done yet; return whether the whole deck is complete.
+
+        `build_chunk(chunk)` writes the chunk's files and returns their paths;
+        the chunk is only recorded as done once it returns.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        todo = [c for c in self.chunks if c.in_pages(pages) and not self.is_done(c)]
+        skipped = sum(1 for c in self.chunks if c.in_pages(pages)) - len(todo)
+        if skipped:
+            print(f"{self.kind}: {skipped} chunk(s) already built, {len(todo)} to go")
+        for chunk in todo:
+            with profiling.stage("chunk." + self.kind, item=f"pages {chunk.first_page}-{chunk.last_page}"):
+                files = build_chunk(chunk)
+            self.mark_done(chunk, files)
+            print(f"{self.kind}: pages {chunk.first_page}-{chunk.last_page} done ({chunk.index + 1}/{len(self.chunks)})")
+        done = [self.is_done(c) for c in self.chunks]
+        self.write_manifest(done)
+        return all(done)
+
+    def write_manifest(self, done=None):
+        if done is None:
+            done = [self.is_done(c) for c in self.chunks]
+        _write_json(os.path.join(self.directory, f"{self.kind}_manifest.json"), {
+            "kind": self.kind,
+            "cards": len(self.tracks),
+            "chunk_cards": self.chunk_cards,
+            "chunks": [
+                {"index": c.index, "pages": [c.first_page, c.last_page], "key": c.key, "complete": ok}
+                for c, ok in zip(self.chunks, done)
+            ],
+        })
+
+
+def _object_digest(obj, memo):
+    # Content hash of a PDF object with the objects it references, so two
+    # copies of the same image or form from different chunk PDFs hash alike
+    if isinstance(obj, IndirectObject):
+        ref = (id(obj.pdf), obj.idnum)
+        digest = memo.get(ref)
+        if digest is None:
+            memo[ref] = "cycle"
+            digest = memo[ref] = _object_digest(obj.get_object(), memo)
+        return digest
+    h = hashlib.sha256(type(obj).__name__.encode())
+    if isinstance(obj, DictionaryObject):
+        for key in sorted(obj):
+            h.update(key.encode() + _object_digest(obj.raw_get(key), memo).encode())
+        if isinstance(obj, StreamObject):
+            h.update(obj.get_data())
+    elif isinstance(obj, ArrayObject):
+        for item in obj:
+            h.update(_object_digest(item, memo).encode())
+    else:
+        h.update(repr(obj).encode())
+    return h.hexdigest()
+
+
+def _share_xobjects(readers):
+    """Point every page of `readers` at the first copy of each identical image/form XObject.
+
+    Every chunk PDF embeds its own copy of the card backgrounds (overlay and
+    vector modes). Pages of later chunks are pointed at the copy in an
+    earlier reader; `PdfWriter.add_page` then clones that copy only once, and
+    the unused copies never reach the writer. Forms are matched after their
+    own XObjects, so a background image is shared even when the forms around
+    it differ (reportlab gives forms the document's font resources, whose
+    subsets differ per chunk).
+    """
+    memo = {}
+    seen = {}
+
+    def share(xobjects):
+        xobjects = xobjects.get_object()
+        for name in list(xobjects):
+            ref = xobjects.raw_get(name)
+            if not isinstance(ref, IndirectObject):
+                continue
+            resources = ref.get_object().get("/Resources")
+            nested = resources.get_object().get("/XObject") if resources is not None else None
+            if nested is not None:
+                share(nested)
+            xobjects[NameObject(name)] = seen.setdefault(_object_digest(ref, memo), ref)
+
+    for reader in readers:
+        for page in reader.pages:
+            resources = page.get("/Resources")
+            xobjects = resources.get_object().get("/XObject") if resources is not None else None
+            if xobjects is not None:
+                share(xobjects)
+
+
+def concat_pdfs(paths, output_path):
+    """Write the pages of `paths`, in order, to `output_path` (atomically)."""
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with atomic_path(output_path) as tmp:
+        if len(paths) == 1:
+            shutil.copyfile(paths[0], tmp)
+        else:
+            readers = [PdfReader(path) for path in paths]
+            _share_xobjects(readers)
+            writer = PdfWriter()
+            for reader in readers:
+                for page in reader.pages:
+                    writer.add_page(page)
+            with open(tmp, "wb") as f:
+                writer.write(f)
+    return output_path
+
+
+def build_duplex_chunked(tracks, qr_pdf, text_pdf, chunk_dir, renderer=None, workers=None, png_dir=None, layout=None, text_placement="rtl", output_mode=None, combined_pdf=None, pages=None, chunk_pages=None):
+    """`create_duplex_pdfs` in resumable chunks; return whether the final PDFs were assembled.
+
+    With `pages` (a `(first, last)` range, see `parse_page_range`) only the
+    chunks covering those pages are built; the PDFs are assembled whenever
+    every chunk of the deck is complete.
+    """
+    from main.duplex import create_duplex_pdfs
+    from main.render_pool import open_render_pool
+    if layout is None:
+        layout = PageLayout()
+    if output_mode is None:
+        output_mode = PDF_OUTPUT_MODE
+    if renderer is None:
+        renderer = get_renderer()
+    outputs = {"qr": qr_pdf, "text": text_pdf, "combined": combined_pdf}
+    outputs = {side: path for side, path in outputs.items() if path}
+    settings = render_settings(
+        renderer, layout, output_mode=output_mode, text_placement=text_placement, outputs=sorted(outputs),
+        png_dir=os.path.abspath(png_dir) if png_dir else None,
+    )
+    build = ChunkedBuild(chunk_dir, "duplex", tracks, settings, layout.per_page, chunk_pages)
+
+    def build_chunk(chunk):
+        paths = {side: build.chunk_path(chunk, side + ".pdf") for side in outputs}
+        create_duplex_pdfs(
+            tracks[chunk.start:chunk.stop], paths.get("qr"), paths.get("text"), renderer=renderer, workers=workers,
+            png_dir=png_dir, layout=layout, text_placement=text_placement, output_mode=output_mode,
+            combined_pdf=paths.get("combined"), first_card=chunk.start, pool=pool,
+        )
+        return list(paths.values())
+
+    # One set of workers for every chunk, so templates and fonts load once
+    with open_render_pool(renderer, workers) as pool:
+        complete = build.run(build_chunk, pages)
+    if not complete:
+        missing = [f"{c.first_page}-{c.last_page}" for c in build.chunks if not build.is_done(c)]
+        print(f"Not assembling yet; pages still to build: {', '.join(missing)}")
+        return False
+    with profiling.stage("pdf.assemble"):
+        for side, path in outputs.items():
+            concat_pdfs([build.chunk_path(c, side + ".pdf") for c in build.chunks], path)
+    return True
+
+
+def export_pngs_chunked(tracks, output_dir, chunk_dir, renderer=None, workers=None, pages=None, chunk_pages=None):
+    """Write `NNN_qr_back.png` / `NNN_text_front.png` for every card in resumable chunks.
+
+    Pages are counted as in the PDFs (`PageLayout()`); returns whether every
+    card has its PNGs.
+    """
+    from main.export_card_pngs import render_card_pngs
+    from main.render_pool import open_render_pool
+    if renderer is None:
+        renderer = get_renderer()
+    layout = PageLayout()
+    # Output file names depend on the card's position, so that is an input too
+    build = ChunkedBuild(chunk_dir, "pngs", tracks, render_settings(renderer, layout, png_dir=os.path.abspath(output_dir)), layout.per_page, chunk_pages)
+    os.makedirs(output_dir, exist_ok=True)
+
+    def build_chunk(chunk):
+        return render_card_pngs(tracks[chunk.start:chunk.stop], output_dir, renderer, workers, chunk.start, pool=pool)
+
+    with open_render_pool(renderer, workers) as pool:
+        return build.run(build_chunk, pages)
@@ -1,3 +1,18 @@
+"""Interleave the text side and the QR side PDFs into one duplex PDF.
+
+Page order is text page 1, QR page 1, text page 2, QR page 2, ..., so the
+result prints double-sided directly. Pages (and the resources they share, such
+as an embedded card background) are copied by reference in a single pass, and
+the output is written once.
+
+Usage:
+- Run as a script to pick a playlist from `main/playlist_list/` and combine
+  its two PDFs.
+- Or call `combine_duplex(text_pdf, qr_pdf, output_path)`.
+
+`create_duplex_pdfs(..., combined_pdf=...)` writes the same interleaved PDF
+directly while rendering, without the two intermediate files.
+"""
 import sys, os
 # Ensure the repository root is on sys.path so `from main.*` imports work
 _repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -5,24 +20,48 @@ if _repo_root not in sys.path:
     sys.path.insert(0, _repo_root)
 
 from PyPDF2 import PdfReader, PdfWriter
+from main import profiling
 from main.config import TEXT_OUTPUT_PDF_TEMPLATE, QR_OUTPUT_PDF_TEMPLATE, COMBINED_OUTPUT_PDF_TEMPLATE
 
-# Let the user pick which `spotify_tracks_*.json` to use from `main/playlist_list/`
-playlist_list_dir = os.path.join(os.path.dirname(__file__), "playlist_list")
-candidates = []
-if os.path.isdir(playlist_list_dir):
-    for fname in sorted(os.listdir(playlist_list_dir)):
-        if fname.startswith("spotify_tracks_") and fname.endswith(".json"):
-            name = fname[len("spotify_tracks_"):-len(".json")]
-            candidates.append((name, fname))
-
-if not candidates:
-    print(f"No spotify_tracks_*.json files found in {playlist_list_dir}")
-    sys.exit(1)
-
-if len(candidates) == 1:
-    playlist_slug = candidates[0][0]
-else:
+
+@profiling.timed("pdf.combine", item_arg=2)
+def combine_duplex(front_pdf, back_pdf, output_path):
+    """Write `output_path` with the pages of `front_pdf` and `back_pdf` alternating."""
+    front = PdfReader(front_pdf)
+    back = PdfReader(back_pdf)
+    writer = PdfWriter()
+
+    num_pages = max(len(front.pages), len(back.pages))
+    for i in range(num_pages):
+        if i < len(front.pages):
+            writer.add_page(front.pages[i])
+        if i < len(back.pages):
+            writer.add_page(back.pages[i])
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(output_path, "wb") as f:
+        writer.write(f)
+    return output_path
+
+
+def select_playlist_slug():
+    """Let the user pick which `spotify_tracks_*.json` to use from `main/playlist_list/`."""
+    playlist_list_dir = os.path.join(os.path.dirname(__file__), "playlist_list")
+    candidates = []
+    if os.path.isdir(playlist_list_dir):
+        for fname in sorted(os.listdir(playlist_list_dir)):
+            if fname.startswith("spotify_tracks_") and fname.endswith(".json"):
+                name = fname[len("spotify_tracks_"):-len(".json")]
+                candidates.append((name, fname))
+
+    if not candidates:
+        print(f"No spotify_tracks_*.json files found in {playlist_list_dir}")
+        sys.exit(1)
+
+    if len(candidates) == 1:
+        return candidates[0][0]
     print("Select playlist list to combine PDFs:")
     for i, (name, fname) in enumerate(candidates, start=1):
         print(f"{i}: {fname}")
@@ -33,38 +72,20 @@ else:
         try:
             idx = int(sel)
             if 1 <= idx <= len(candidates):
-                playlist_slug = candidates[idx-1][0]
-                break
+                return candidates[idx-1][0]
         except Exception:
             pass
         print("Invalid selection, try again.")
 
-pdf1_path = TEXT_OUTPUT_PDF_TEMPLATE.format(playlist_slug=playlist_slug)
-pdf2_path = QR_OUTPUT_PDF_TEMPLATE.format(playlist_slug=playlist_slug)
-output_path = COMBINED_OUTPUT_PDF_TEMPLATE.format(playlist_slug=playlist_slug)
-
-reader1 = PdfReader(pdf1_path)
-reader2 = PdfReader(pdf2_path)
-writer = PdfWriter()
-
-num_pages = max(len(reader1.pages), len(reader2.pages))
-
-for i in range(num_pages):
-    if i < len(reader1.pages):
-        writer.add_page(reader1.pages[i])
-    if i < len(reader2.pages):
-        writer.add_page(reader2.pages[i])
-
-with open(output_path, "wb") as f:
-    writer.write(f)
 
-# Ensure output directory exists for combined PDF (already written above, but ensure path is correct)
-output_dir = os.path.dirname(output_path)
-if output_dir and not os.path.exists(output_dir):
-    os.makedirs(output_dir, exist_ok=True)
+def main():
+    playlist_slug = select_playlist_slug()
+    pdf1_path = TEXT_OUTPUT_PDF_TEMPLATE.format(playlist_slug=playlist_slug)
+    pdf2_path = QR_OUTPUT_PDF_TEMPLATE.format(playlist_slug=playlist_slug)
+    output_path = COMBINED_OUTPUT_PDF_TEMPLATE.format(playlist_slug=playlist_slug)
+    combine_duplex(pdf1_path, pdf2_path, output_path)
+    print(f"Combined PDF written to {output_path}")
 
-# If file was written to a directory that didn't exist previously, re-write to be safe
-with open(output_path, "wb") as f:
-    writer.write(f)
 
-print(f"Combined PDF written to {output_path}")
+if __name__ == "__main__":
+    main()
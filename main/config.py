@@ -106,7 +106,102 @@ PNG_OUTPUT_DIR_TEMPLATE = os.environ.get(
 # Layout / card constants
 # Card size in centimeters (each card is square)
 CARD_SIZE_CM = float(os.environ.get("CARD_SIZE_CM", 6.5))
+# Print resolution of the cards in dots per inch. The background templates
+# are resampled once to CARD_SIZE_CM at this DPI, so every later step works
+# on exactly the pixels the printer needs: e.g. 300 for print, 150 for quick
+# proofs. 0 keeps the templates' own resolution.
+CARD_DPI = int(os.environ.get("CARD_DPI", 300))
 # Default grid size (columns x rows) when fixed layout is used
 CARDS_COLS = int(os.environ.get("CARDS_COLS", 3))
 CARDS_ROWS = int(os.environ.get("CARDS_ROWS", 4))
 
+# Rendering
+# Number of worker processes used to render cards for the PDFs.
+# 0 (default) uses one worker per CPU; 1 renders serially in the main process.
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", 0))
+# Cards are handed to reportlab in memory. Set KEEP_CARD_PNGS=1 to also write
+# the rendered faces to the per-playlist PNG output directory during PDF builds.
+KEEP_CARD_PNGS = os.environ.get("KEEP_CARD_PNGS", "").lower() in ("1", "true", "yes")
+# PDF output mode for the duplex builder:
+# - "raster": every card is one full bitmap (background with QR/text baked in)
+# - "overlay": each background is embedded once and cards only add the QR as
+#   vector rectangles and the text as a small transparent image
+# - "vector": as "overlay", but the text is drawn as real PDF text with
+#   embedded fonts (resolution independent, smallest files)
+PDF_OUTPUT_MODE = os.environ.get("PDF_OUTPUT_MODE", "raster").lower()
+# How card bitmaps (raster cards and overlay backgrounds) are stored in the
+# PDFs: "flate" (lossless) or "jpeg" (much smaller, PDF_JPEG_QUALITY).
+# Images with transparency, such as the text overlays, always use flate.
+PDF_IMAGE_ENCODING = os.environ.get("PDF_IMAGE_ENCODING", "flate").lower()
+PDF_JPEG_QUALITY = int(os.environ.get("PDF_JPEG_QUALITY", 90))
+# Compress the page content streams (vector QR codes and card text)
+PDF_PAGE_COMPRESSION = os.environ.get("PDF_PAGE_COMPRESSION", "1").lower() in ("1", "true", "yes")
+# On-disk cache of rendered card faces, keyed by a hash of everything that
+# affects them (track text/URL, template file, fonts, QR/glow settings, card
+# size). Set RENDER_CACHE_DIR to an empty string to disable it.
+RENDER_CACHE_DIR = os.environ.get(
+    "RENDER_CACHE_DIR",
+    os.path.normpath(os.path.join(os.path.dirname(__file__), "..", ".render_cache")),
+)
+# Least recently used faces are evicted once the cache grows past this size
+RENDER_CACHE_MAX_MB = float(os.environ.get("RENDER_CACHE_MAX_MB", 2048))
+# Encode only `https://open.spotify.com/track/<id>` in the QR codes, dropping
+# query strings such as `?si=...`: shorter payloads need a smaller QR version,
+# so each module prints larger and scans more easily.
+QR_COMPACT_URLS = os.environ.get("QR_COMPACT_URLS", "").lower() in ("1", "true", "yes")
+# Which PDFs the generate scripts write:
+# - "separate" (default): the QR side and the text side as two files
+# - "combined": only the interleaved duplex file (text page, QR page, ...)
+# - "both": all three
+DUPLEX_PDFS = os.environ.get("DUPLEX_PDFS", "separate").lower()
+# Build decks in chunks of this many pages, each recorded in the chunk
+# directory once complete, so a failed or interrupted build resumes at the
+# first missing chunk (see `main.chunked_build`). 0 builds in one pass.
+BUILD_CHUNK_PAGES = int(os.environ.get("BUILD_CHUNK_PAGES", 10))
+# Per-playlist directory for the chunk files and their records
+BUILD_CHUNK_DIR_TEMPLATE = os.environ.get(
+    "BUILD_CHUNK_DIR_TEMPLATE",
+    os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "output", "{playlist_slug}", "chunks")),
+)
+
+# Spotify
+# Concurrent requests used to fetch the pages of one playlist
+SPOTIFY_FETCH_WORKERS = int(os.environ.get("SPOTIFY_FETCH_WORKERS", 8))
+# Playlists fetched at the same time by the wrapped exporter
+SPOTIFY_PLAYLIST_WORKERS = int(os.environ.get("SPOTIFY_PLAYLIST_WORKERS", 4))
+# Attempts per API call after a 429 or a transient (5xx / connection) failure
+SPOTIFY_MAX_RETRIES = int(os.environ.get("SPOTIFY_MAX_RETRIES", 5))
+# Client-credentials token cache, reused until the token expires. Keep it out
+# of version control; set to an empty string to keep the token in memory only.
+SPOTIFY_TOKEN_CACHE = os.environ.get(
+    "SPOTIFY_TOKEN_CACHE",
+    os.path.normpath(os.path.join(os.path.dirname(__file__), "..", ".spotify_token_cache")),
+)
+# Local copy of each synced playlist (name, slug, snapshot_id and tracks);
+# unchanged playlists are served from here. Empty string disables it.
+PLAYLIST_CACHE_DIR = os.environ.get(
+    "PLAYLIST_CACHE_DIR",
+    os.path.normpath(os.path.join(os.path.dirname(__file__), "..", ".playlist_cache")),
+)
+# Alternative Spotify endpoints, e.g. the local stand-in from `main.fake_spotify`
+# ("http://127.0.0.1:8765/v1/" and "http://127.0.0.1:8765/api/token").
+# Empty means the real Spotify API.
+SPOTIFY_API_PREFIX = os.environ.get("SPOTIFY_API_PREFIX", "")
+SPOTIFY_TOKEN_URL = os.environ.get("SPOTIFY_TOKEN_URL", "")
+
+# Track catalogue
+# SQLite database mirroring the per-playlist JSON files (see `main.catalogue`).
+# Keep it out of version control; the JSON files remain the shared copy.
+CATALOGUE_DB = os.environ.get(
+    "CATALOGUE_DB",
+    os.path.normpath(os.path.join(os.path.dirname(__file__), "..", ".catalogue.sqlite3")),
+)
+
+# Profiling (see `main.profiling`)
+# Set PROFILE=1 to time every pipeline stage and write a JSON report at exit
+PROFILE = os.environ.get("PROFILE", "").lower() in ("1", "true", "yes")
+PROFILE_REPORT = os.environ.get("PROFILE_REPORT", "profile_report.json")
+# Run cProfile around every call of this stage (e.g. "card.text"); stats go to <report>.prof
+PROFILE_STAGE = os.environ.get("PROFILE_STAGE", "")
+# Slowest cards listed per stage
+PROFILE_SLOWEST = int(os.environ.get("PROFILE_SLOWEST", 10))
@@ -0,0 +1,286 @@
+"""Fuzzy duplicate detection for track lists.
+
+Finds tracks whose normalized title and artist are similar enough to be the
+same song (the rules `check_duplicates.py` has always used) without comparing
+every pair:
+
+1. Tracks with the same normalized (title, artist) are merged up front; they
+   always match each other and score the same against everyone else.
+2. Candidate title pairs come from blocking on the distinct titles:
+   - an inverted index of title words (pairs sharing a word, which covers the
+     "one title contains the other" case token_set_ratio scores as 100);
+     words in more than `max_block` titles are too common to block on;
+   - a sorted neighbourhood over the title letters (words sorted, spaces
+     removed), read forwards and backwards, which catches spelling variants
+     that share no whole word.
+3. Candidate titles are scored in batches: with rapidfuzz through `cpdist` on
+   all cores, otherwise with difflib behind its cheap upper bounds on a
+   process pool. Artists are only compared between tracks whose titles match.
+
+Matching tracks are merged with union-find into groups of track indices.
+Blocking can in principle miss a pair the all-pairs scan would find;
+`pairwise_duplicate_groups` (or `check_duplicates.py --verify`) is the
+reference to check against.
+
+Usage:
+    groups = find_duplicate_groups(tracks)
+    for group, urls in find_collisions(tracks): ...
+"""
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+import os
+import re
+
+
+# Thresholds (percent)
+TITLE_THRESH = 85
+ARTIST_THRESH = 75
+# A very similar title is enough with a somewhat different artist
+STRONG_TITLE_THRESH = 92
+WEAK_ARTIST_THRESH = 60
+
+# Words in more titles than this are not used as blocking keys
+MAX_BLOCK = 400
+# Neighbours compared on each side in the sorted-neighbourhood pass
+WINDOW = 8
+
+# Try rapidfuzz for better fuzzy matching, fall back to difflib
+try:
+    from rapidfuzz import fuzz
+    try:
+        from rapidfuzz.process import cpdist
+    except ImportError:  # rapidfuzz < 3.6
+        cpdist = None
+
+    def similarity(a, b):
+        return fuzz.token_set_ratio(a, b)
+
+    HAVE_RAPIDFUZZ = True
+except Exception:
+    from difflib import SequenceMatcher
+
+    def similarity(a, b):
+        return int(SequenceMatcher(None, a, b).ratio() * 100)
+
+    HAVE_RAPIDFUZZ = False
+    cpdist = None
+
+
+def normalize(s):
+    if not s:
+        return ""
+    s = s.lower()
+    # remove parenthetical/bracketed info like (remastered), [live], etc.
+    s = re.sub(r"[\(\[\{].*?[\)\]\}]", "", s)
+    # remove common suffixes/words that don't change identity
+    s = re.sub(r"\b(remastered|remaster|edit|live|version|single|mono|stereo)\b", "", s)
+    # strip punctuation, extra whitespace
+    s = re.sub(r"[^\w\s]", " ", s)
+    s = re.sub(r"\s+", " ", s).strip()
+    return s
+
+
+def is_match(title_sim, artist_sim):
+    """Consider a match if both title and artist are similar enough,
+    or the title is very similar even if the artist differs slightly."""
+    return (title_sim >= TITLE_THRESH and artist_sim >= ARTIST_THRESH) or (
+        title_sim >= STRONG_TITLE_THRESH and artist_sim >= WEAK_ARTIST_THRESH
+    )
+
+
+def track_key(track):
+    """Return the normalized `(title, artist)` a track is compared on."""
+    return normalize((track.get("title") or "").strip()), normalize((track.get("artist") or "").strip())
+
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[rb] = ra
+
+
+def candidate_pairs(titles, max_block=MAX_BLOCK, window=WINDOW):
+    """Return the set of `(i, j)` (i < j) title index pairs worth scoring."""
+    pairs = set()
+    index = defaultdict(list)
+    for i, title in enumerate(titles):
+        for word in set(title.split()):
+            index[word].append(i)
+    for ids in index.values():
+        if 1 < len(ids) <= max_block:
+            pairs.update(combinations(ids, 2))
+
+    letters = ["".join(sorted(title.split())) for title in titles]
+    for key in (letters, [s[::-1] for s in letters]):
+        order = sorted(range(len(titles)), key=key.__getitem__)
+        for pos, i in enumerate(order):
+            for j in order[pos + 1:pos + 1 + window]:
+                pairs.add((i, j) if i < j else (j, i))
+    return pairs
+
+
+def _score_titles(titles, pairs, workers=None, batch_size=50_000):
+    """Yield `(i, j, similarity)` for the candidate title pairs scoring at least `TITLE_THRESH`.
+
+    rapidfuzz's `cpdist` spreads each batch over all cores itself; the
+    difflib fallback sends batches to a process pool of `workers` (default:
+    CPU count) when there is more than one batch.
+    """
+    pairs = sorted(pairs, key=lambda pair: pair[1])
+    batches = [pairs[start:start + batch_size] for start in range(0, len(pairs), batch_size)]
+    if cpdist is not None:
+        for batch in batches:
+            sims = cpdist([titles[i] for i, _ in batch], [titles[j] for _, j in batch],
+                          scorer=fuzz.token_set_ratio, score_cutoff=TITLE_THRESH, workers=-1)
+            for (i, j), sim in zip(batch, sims):
+                if sim >= TITLE_THRESH:
+                    yield i, j, int(sim)
+        return
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(batches) < 2:
+        for batch in batches:
+            yield from _title_matches(titles, batch)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(titles,)) as pool:
+        for matches in pool.map(_worker_title_matches, batches):
+            yield from matches
+
+
+_worker_titles = None
+
+
+def _init_worker(titles):
+    global _worker_titles
+    _worker_titles = titles
+
+
+def _worker_title_matches(batch):
+    return list(_title_matches(_worker_titles, batch))
+
+
+def _title_matches(titles, batch):
+    if HAVE_RAPIDFUZZ:
+        for i, j in batch:
+            sim = similarity(titles[i], titles[j])
+            if sim >= TITLE_THRESH:
+                yield i, j, sim
+        return
+    # difflib is slow to set up per pair, so bound each score cheaply first
+    # (length, then shared characters; both are upper bounds of ratio())
+    # and reuse one matcher per right-hand title.
+    counts = {}
+    matcher = SequenceMatcher(None)
+    current = None
+    for i, j in batch:
+        ti, tj = titles[i], titles[j]
+        total = len(ti) + len(tj)
+        if 200 * min(len(ti), len(tj)) // total < TITLE_THRESH:
+            continue
+        for k, t in ((i, ti), (j, tj)):
+            if k not in counts:
+                counts[k] = Counter(t)
+        if 200 * sum((counts[i] & counts[j]).values()) // total < TITLE_THRESH:
+            continue
+        if current != j:
+            matcher.set_seq2(tj)
+            current = j
+        matcher.set_seq1(ti)
+        sim = int(matcher.ratio() * 100)
+        if sim >= TITLE_THRESH:
+            yield i, j, sim
+
+
+def _artists_match(title_sim, ai, aj):
+    return is_match(title_sim, similarity(ai, aj) if (ai or aj) else 100)  # no artist -> be lenient
+
+
+def find_duplicate_groups(tracks, max_block=MAX_BLOCK, window=WINDOW, workers=None):
+    """Return lists of track indices that are fuzzy duplicates of each other (every track in one group)."""
+    keys = []
+    key_ids = {}
+    track_key_ids = []
+    for t in tracks:
+        key = track_key(t)
+        if not key[0]:
+            # Tracks without a title never match anything
+            track_key_ids.append(None)
+            continue
+        k = key_ids.get(key)
+        if k is None:
+            k = key_ids[key] = len(keys)
+            keys.append(key)
+        track_key_ids.append(k)
+
+    # Distinct titles, each with the keys (i.e. artists) it appears with
+    titles = []
+    title_ids = {}
+    title_keys = []
+    for k, (title, _artist) in enumerate(keys):
+        t = title_ids.get(title)
+        if t is None:
+            t = title_ids[title] = len(titles)
+            titles.append(title)
+            title_keys.append([])
+        title_keys[t].append(k)
+
+    uf = _UnionFind(len(keys))
+    # Same title, different artist
+    for ks in title_keys:
+        for ki, kj in combinations(ks, 2):
+            if _artists_match(100, keys[ki][1], keys[kj][1]):
+                uf.union(ki, kj)
+    for i, j, sim in _score_titles(titles, candidate_pairs(titles, max_block, window), workers):
+        for ki in title_keys[i]:
+            for kj in title_keys[j]:
+                a, b = (ki, kj) if ki < kj else (kj, ki)
+                if _artists_match(sim, keys[a][1], keys[b][1]):
+                    uf.union(a, b)
+
+    groups = defaultdict(list)
+    for idx, k in enumerate(track_key_ids):
+        groups[("k", uf.find(k)) if k is not None else ("t", idx)].append(idx)
+    return list(groups.values())
+
+
+def pairwise_duplicate_groups(tracks):
+    """Reference implementation comparing every pair of tracks (slow; for verification)."""
+    keys = [track_key(t) for t in tracks]
+    uf = _UnionFind(len(tracks))
+    for i in range(len(tracks)):
+        for j in range(i + 1, len(tracks)):
+            if keys[i][0] and keys[j][0] and _artists_match(similarity(keys[i][0], keys[j][0]), keys[i][1], keys[j][1]):
+                uf.union(i, j)
+    groups = defaultdict(list)
+    for idx in range(len(tracks)):
+        groups[uf.find(idx)].append(idx)
+    return list(groups.values())
+
+
+def find_collisions(tracks, groups=None):
+    """Return `(group, urls)` for each duplicate group that spans more than one URL.
+
+    `group` is the list of track indices and `urls` maps each URL to the
+    indices of the tracks that have it.
+    """
+    if groups is None:
+        groups = find_duplicate_groups(tracks)
+    collisions = []
+    for group in groups:
+        urls = defaultdict(list)
+        for idx in group:
+            urls[(tracks[idx].get("url") or "").strip()].append(idx)
+        if len(urls) > 1:
+            collisions.append((group, urls))
+    return collisions
@@ -0,0 +1,153 @@
+"""Build the QR side and the text side of a deck in one pass.
+
+Both faces of a track are rendered together (one task per track on the
+render pool) and placed with the same `PageLayout`: the QR side left to
+right, the text side right to left, so card N on the front always backs
+card N on the back.
+
+Output modes (`PDF_OUTPUT_MODE` or `output_mode=`):
+- "raster": each card is a full bitmap with the QR code or text baked in.
+- "overlay": each background is embedded once per PDF and cards only carry
+  a vector QR code or a small transparent text image (see `main.overlays`).
+- "vector": like "overlay", but the text is real PDF text in the embedded
+  card fonts with a stroked glow, so only the backgrounds are raster.
+
+Usage:
+    create_duplex_pdfs(tracks, qr_pdf, text_pdf)
+    create_duplex_pdfs(tracks, None, None, combined_pdf=print_pdf)
+"""
+import os
+from main.card_renderer import card_png_path, get_renderer
+from main.config import COMBINED_OUTPUT_PDF_TEMPLATE, DUPLEX_PDFS, PDF_OUTPUT_MODE, QR_OUTPUT_PDF_TEMPLATE, TEXT_OUTPUT_PDF_TEMPLATE
+from main.layout import PageLayout, draw_card, draw_overlay_card, open_canvas
+from main.qr_on_bg import create_qr_card, create_qr_overlay
+from main.render_pool import iter_render_cards
+from main import profiling
+from main.text_on_bg import create_text_card, create_text_overlay, create_text_vector
+
+
+OUTPUT_MODES = ("raster", "overlay", "vector")
+DUPLEX_OUTPUTS = ("separate", "combined", "both")
+
+
+def output_paths(playlist_slug, outputs=None):
+    """Return `(qr_pdf, text_pdf, combined_pdf)` for a playlist per `DUPLEX_PDFS`; skipped ones are None."""
+    if outputs is None:
+        outputs = DUPLEX_PDFS
+    if outputs not in DUPLEX_OUTPUTS:
+        raise ValueError(f"Unknown duplex PDF outputs {outputs!r}; expected one of {DUPLEX_OUTPUTS}")
+    qr_pdf = text_pdf = combined_pdf = None
+    if outputs != "combined":
+        qr_pdf = QR_OUTPUT_PDF_TEMPLATE.format(playlist_slug=playlist_slug)
+        text_pdf = TEXT_OUTPUT_PDF_TEMPLATE.format(playlist_slug=playlist_slug)
+    if outputs != "separate":
+        combined_pdf = COMBINED_OUTPUT_PDF_TEMPLATE.format(playlist_slug=playlist_slug)
+    return qr_pdf, text_pdf, combined_pdf
+
+
+def render_card_pair(track, renderer=None):
+    """Return `(qr_image, text_image)` for one track."""
+    return create_qr_card(track["url"], renderer), create_text_card(track, renderer)
+
+
+def render_overlay_pair(track, renderer=None):
+    """Return `(qr_overlay, text_overlay)` for one track."""
+    return create_qr_overlay(track["url"], renderer), create_text_overlay(track, renderer)
+
+
+def render_vector_pair(track, renderer=None):
+    """Return `(qr_overlay, text_overlay)` for one track with the text as PDF text."""
+    return create_qr_overlay(track["url"], renderer), create_text_vector(track, renderer)
+
+
+def create_duplex_pdfs(tracks, qr_pdf, text_pdf, renderer=None, workers=None, png_dir=None, layout=None, text_placement="rtl", output_mode=None, combined_pdf=None, first_card=0, pool=None):
+    """Render every track once and write both side PDFs.
+
+    `combined_pdf` additionally (or, with `qr_pdf`/`text_pdf` set to None,
+    only) writes the interleaved print file: text page 1, QR page 1, text
+    page 2, ... as `main.combine_pdfs` would produce from the two sides.
+    `first_card` is the deck position of `tracks[0]`, for the PNG names
+    when building part of a deck (see `main.chunked_build`). `pool` is a
+    shared `main.render_pool.RenderPool` to render on instead of a new one.
+    """
+    if layout is None:
+        layout = PageLayout()
+    if output_mode is None:
+        output_mode = PDF_OUTPUT_MODE
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown PDF output mode {output_mode!r}; expected one of {OUTPUT_MODES}")
+    if output_mode != "raster" and png_dir:
+        raise ValueError("Card PNGs can only be kept in 'raster' output mode.")
+    if renderer is None:
+        renderer = get_renderer()
+
+    qr_canvas = _open_canvas(qr_pdf, layout)
+    text_canvas = _open_canvas(text_pdf, layout)
+    combined_canvas = _open_canvas(combined_pdf, layout)
+    # Stream: cards are rendered about one page ahead of placement, so only a
+    # page worth of faces is ever held in memory regardless of deck size.
+    jobs = ((track,) for track in tracks)
+    if output_mode in ("overlay", "vector"):
+        render_fn = render_overlay_pair if output_mode == "overlay" else render_vector_pair
+        pairs = iter_render_cards(render_fn, jobs, renderer, workers, window=layout.per_page, pool=pool)
+        # Distinct names, since the combined PDF holds both backgrounds
+        backgrounds = (("QRBackground", renderer.qr_template()), ("TextBackground", renderer.text_template()))
+
+        def place(c, side, face, index, placement):
+            name, background = backgrounds[side]
+            with profiling.stage("pdf.place"):
+                draw_overlay_card(c, name, background, face, index, layout, placement)
+    else:
+        pairs = iter_render_cards(render_card_pair, jobs, renderer, workers, window=layout.per_page, pool=pool)
+        if png_dir:
+            pairs = _save_pair_pngs(pairs, png_dir, first_card)
+
+        def place(c, side, face, index, placement):
+            with profiling.stage("pdf.place"):
+                draw_card(c, face, index, layout, placement)
+
+    page = []
+    for index, (qr_face, text_face) in enumerate(pairs):
+        if qr_canvas:
+            place(qr_canvas, 0, qr_face, index, "ltr")
+        if text_canvas:
+            place(text_canvas, 1, text_face, index, text_placement)
+        if combined_canvas:
+            page.append((qr_face, text_face))
+            if len(page) == layout.per_page:
+                _place_combined_page(combined_canvas, page, place, text_placement)
+                page = []
+    if combined_canvas and page:
+        _place_combined_page(combined_canvas, page, place, text_placement)
+    for c in (qr_canvas, text_canvas, combined_canvas):
+        if c:
+            with profiling.stage("pdf.save", item=c._filename):
+                c.save()
+
+
+def _open_canvas(filename, layout):
+    if not filename:
+        return None
+    out_dir = os.path.dirname(filename)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    return open_canvas(filename, layout)
+
+
+def _place_combined_page(c, page, place, text_placement):
+    # Text side first, then the QR side that backs it
+    for slot, (_qr_face, text_face) in enumerate(page):
+        place(c, 1, text_face, slot, text_placement)
+    c.showPage()
+    for slot, (qr_face, _text_face) in enumerate(page):
+        place(c, 0, qr_face, slot, "ltr")
+    c.showPage()
+
+
+def _save_pair_pngs(pairs, png_dir, first_card=0):
+    os.makedirs(png_dir, exist_ok=True)
+    for idx, (qr_img, text_img) in enumerate(pairs, first_card):
+        with profiling.stage("png.encode"):
+            qr_img.save(card_png_path(png_dir, idx, "qr_back"))
+            text_img.save(card_png_path(png_dir, idx, "text_front"))
+        yield qr_img, text_img
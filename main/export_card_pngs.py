@@ -1,32 +1,75 @@
 import os
-import json
+import sys
+
+# make repo root importable like other scripts
+_repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _repo_root not in sys.path:
+    sys.path.insert(0, _repo_root)
+
 from main.qr_on_bg import create_qr_on_bg
 from main.text_on_bg import create_text_on_bg
+from main.card_renderer import CardRenderer, card_png_path
+from main.catalogue import load_tracks
+from main.render_pool import render_cards
 from main.manual_tracks import manual_tracks
-from main.config import SPOTIFY_TRACKS_JSON_TEMPLATE, PNG_OUTPUT_DIR, PNG_OUTPUT_DIR_TEMPLATE, get_playlist_url
+from main.chunked_build import export_pngs_chunked
+from main.config import SPOTIFY_TRACKS_JSON_TEMPLATE, PNG_OUTPUT_DIR, PNG_OUTPUT_DIR_TEMPLATE, BUILD_CHUNK_PAGES, BUILD_CHUNK_DIR_TEMPLATE, get_playlist_url
 from main.spotify_utils import get_playlist_slug
 
-# Load tracks from spotify_tracks.json and manual_tracks
-playlist_url = get_playlist_url()
-playlist_slug = get_playlist_slug(playlist_url)
-spotify_tracks_json = SPOTIFY_TRACKS_JSON_TEMPLATE.format(playlist_slug=playlist_slug)
-# Determine PNG output directory for this playlist
-try:
-    output_dir = PNG_OUTPUT_DIR_TEMPLATE.format(playlist_slug=playlist_slug)
-except Exception:
-    output_dir = PNG_OUTPUT_DIR
-with open(spotify_tracks_json, "r", encoding="utf-8") as f:
-    spotify_tracks = json.load(f)
-tracks = spotify_tracks + manual_tracks
-
-# Output folder
-os.makedirs(output_dir, exist_ok=True)
-
-for idx, track in enumerate(tracks):
-    fileid = f"{idx+1:03d}"
-    qr_path = os.path.join(output_dir, f"{fileid}_qr_back.png")
-    text_path = os.path.join(output_dir, f"{fileid}_text_front.png")
-    create_qr_on_bg(track["url"], qr_path)
-    create_text_on_bg(track, text_path)
-
-print(f"Generated {len(tracks)} pairs of PNGs in {output_dir}/")
+
+def render_card_pngs(tracks, output_dir, renderer=None, workers=None, first_card=0, pool=None):
+    """Write `NNN_qr_back.png` / `NNN_text_front.png` for `tracks` and return the paths.
+
+    `first_card` is the deck position of `tracks[0]`; `pool` is a shared
+    `main.render_pool.RenderPool` to render on.
+    """
+    qr_jobs = []
+    text_jobs = []
+    for idx, track in enumerate(tracks, first_card):
+        qr_jobs.append((track["url"], card_png_path(output_dir, idx, "qr_back")))
+        text_jobs.append((track, card_png_path(output_dir, idx, "text_front")))
+    # Cards are rendered on a process pool (RENDER_WORKERS, default: all CPUs)
+    render_cards(create_qr_on_bg, qr_jobs, renderer, workers, pool=pool)
+    render_cards(create_text_on_bg, text_jobs, renderer, workers, pool=pool)
+    return [path for _, path in qr_jobs + text_jobs]
+
+
+def export_card_pngs(playlist_url=None, renderer=None, pages=None):
+    """Write the QR and text PNG of every card of a playlist (plus manual tracks); return the directory.
+
+    Cards are rendered in resumable page chunks unless BUILD_CHUNK_PAGES=0;
+    `pages` (e.g. `(1, 40)`) renders only the cards on those PDF pages.
+    """
+    # Load tracks from spotify_tracks.json and manual_tracks
+    playlist_url = playlist_url or get_playlist_url()
+    playlist_slug = get_playlist_slug(playlist_url)
+    spotify_tracks_json = SPOTIFY_TRACKS_JSON_TEMPLATE.format(playlist_slug=playlist_slug)
+    # Determine PNG output directory for this playlist
+    try:
+        output_dir = PNG_OUTPUT_DIR_TEMPLATE.format(playlist_slug=playlist_slug)
+    except Exception:
+        output_dir = PNG_OUTPUT_DIR
+    spotify_tracks = load_tracks(playlist_slug, spotify_tracks_json)
+    tracks = spotify_tracks + manual_tracks
+
+    # Output folder
+    os.makedirs(output_dir, exist_ok=True)
+
+    # One renderer for the whole deck: templates and fonts are loaded once
+    if renderer is None:
+        renderer = CardRenderer()
+
+    if BUILD_CHUNK_PAGES > 0:
+        chunk_dir = BUILD_CHUNK_DIR_TEMPLATE.format(playlist_slug=playlist_slug)
+        if export_pngs_chunked(tracks, output_dir, chunk_dir, renderer, pages=pages):
+            print(f"Generated {len(tracks)} pairs of PNGs in {output_dir}/")
+        return output_dir
+
+    render_card_pngs(tracks, output_dir, renderer)
+    print(f"Generated {len(tracks)} pairs of PNGs in {output_dir}/")
+    return output_dir
+
+
+# Guard needed so worker processes can import this module without re-running it
+if __name__ == "__main__":
+    export_card_pngs()
@@ -4,10 +4,15 @@
 Creates: main/playlist_list/spotify_tracks_wrapped_full.json
 
 Each element contains: title, artist, year, url, checked, name, order
+
+Playlists are fetched concurrently (`SPOTIFY_PLAYLIST_WORKERS` at a time);
+the output keeps the order of `wrapped_hitster.json`, and `order` is each
+track's 1-based position in its person's playlist.
 """
 import json
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 # make repo root importable like other scripts
 _repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -21,7 +26,8 @@ try:
 except ImportError:
     pass
 
-from main.spotify_utils import get_playlist_tracks
+from main.config import SPOTIFY_PLAYLIST_WORKERS
+from main.spotify_utils import sync_playlist
 
 
 WRAPPED_PATH = os.path.join(os.path.dirname(__file__), "input files", "wrapped_hitster.json")
@@ -41,20 +47,37 @@ def write_output(path, items):
         json.dump(items, f, ensure_ascii=False, indent=2)
 
 
-def build_wrapped_full(wrapped_list):
-    all_items = []
+def _fetch_entry(playlist_entry):
+    # Rate limits and transient errors are retried inside `spotify_utils`;
+    # playlists whose snapshot did not change come from the local cache
+    name = playlist_entry.get("name")
+    url = playlist_entry.get("url")
+    try:
+        return sync_playlist(url)["tracks"] or []
+    except Exception as exc:
+        print(f"Failed to fetch tracks for {name} ({url}): {exc}")
+        return None
+
+
+def build_wrapped_full(wrapped_list, workers=None):
+    entries = []
     for playlist_entry in wrapped_list:
-        name = playlist_entry.get("name")
-        url = playlist_entry.get("url")
-        if not url:
+        if not playlist_entry.get("url"):
             print(f"Skipping entry with no url: {playlist_entry}")
             continue
-        try:
-            tracks = get_playlist_tracks(url) or []
-        except Exception as exc:
-            print(f"Failed to fetch tracks for {name} ({url}): {exc}")
-            continue
+        entries.append(playlist_entry)
+
+    if workers is None:
+        workers = SPOTIFY_PLAYLIST_WORKERS
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        # map() returns the playlists in wrapped list order
+        fetched = list(pool.map(_fetch_entry, entries))
 
+    all_items = []
+    for playlist_entry, tracks in zip(entries, fetched):
+        if tracks is None:
+            continue
+        name = playlist_entry.get("name")
         for idx, t in enumerate(tracks, start=1):
             item = {
                 "title": t.get("title", ""),
@@ -71,15 +94,16 @@ def build_wrapped_full(wrapped_list):
     return all_items
 
 
-def main():
-    if not os.path.exists(WRAPPED_PATH):
-        print(f"Wrapped input not found: {WRAPPED_PATH}")
+def main(wrapped_path=WRAPPED_PATH, out_path=OUT_PATH):
+    if not os.path.exists(wrapped_path):
+        print(f"Wrapped input not found: {wrapped_path}")
         sys.exit(1)
 
-    wrapped = load_wrapped(WRAPPED_PATH)
+    wrapped = load_wrapped(wrapped_path)
     items = build_wrapped_full(wrapped)
-    write_output(OUT_PATH, items)
-    print(f"Wrote {len(items)} tracks to {OUT_PATH}")
+    write_output(out_path, items)
+    print(f"Wrote {len(items)} tracks to {out_path}")
+    return out_path
 
 
 if __name__ == "__main__":
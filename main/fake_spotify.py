@@ -0,0 +1,203 @@
+"""Local stand-in for the parts of the Spotify Web API this project uses.
+
+Serves the client-credentials token endpoint, playlist metadata and paged
+playlist items for synthetic playlists, so `main.spotify_utils` can be run
+and measured without credentials or network access.
+
+- `POST /api/token`: always hands out a token.
+- `GET /v1/playlists/<id>`: name, `snapshot_id` and item total.
+- `GET /v1/playlists/<id>/items`: one page (`limit`/`offset`, max 100).
+
+A playlist id `synthetic<N>` has N tracks; other ids get `default_size`
+tracks. Track data is derived from the id, so every run sees the same
+playlists. Optional per-request `latency` and a 429 with `Retry-After` on
+every `rate_limit_every`-th API request simulate a slow or throttled API.
+
+Usage:
+    python main/fake_spotify.py --port 8765 --latency 0.05
+    SPOTIFY_API_PREFIX=http://127.0.0.1:8765/v1/ SPOTIFY_TOKEN_URL=http://127.0.0.1:8765/api/token \\
+        SPOTIFY_CLIENT_ID=x SPOTIFY_CLIENT_SECRET=y python main/export_spotify_tracks.py
+
+Or in-process: `server = FakeSpotifyServer(latency=0.05).start()`, then read
+`server.api_prefix`, `server.token_url` and `server.counts`.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+PAGE_LIMIT = 100
+_ID_CHARS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+_WORDS = (
+    "love night dance heart summer fire dream gold blue road light rain "
+    "wild river city star home time girl boy baby money party ocean moon"
+).split()
+
+
+def synthetic_track(playlist_id, index):
+    """Return the Spotify track object at `index` of a synthetic playlist."""
+    rng = random.Random(f"{playlist_id}:{index}")
+    title = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(1, 4))).title()
+    artists = [{"name": " ".join(rng.choice(_WORDS) for _ in range(rng.randint(1, 2))).title()} for _ in range(rng.randint(1, 2))]
+    year = rng.randint(1960, 2025)
+    track_id = "".join(rng.choice(_ID_CHARS) for _ in range(22))
+    return {
+        "name": title,
+        "artists": artists,
+        "album": {"name": title + " (Album)", "release_date": f"{year}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}"},
+        "external_urls": {"spotify": f"https://open.spotify.com/track/{track_id}"},
+    }
+
+
+class FakeSpotifyServer:
+    """A threaded HTTP server imitating the Spotify token and playlist endpoints."""
+
+    def __init__(self, host="127.0.0.1", port=0, default_size=250, latency=0.0, rate_limit_every=0, retry_after=1):
+        self.default_size = default_size
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        # Requests served per kind: "token", "playlist", "items", "429"
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._api_requests = 0
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_prefix(self):
+        return self.base_url + "/v1/"
+
+    @property
+    def token_url(self):
+        return self.base_url + "/api/token"
+
+    def playlist_size(self, playlist_id):
+        if playlist_id.startswith("synthetic") and playlist_id[len("synthetic"):].isdigit():
+            return int(playlist_id[len("synthetic"):])
+        return self.default_size
+
+    def start(self):
+        """Serve in a background thread and return self."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def _count(self, kind):
+        with self._lock:
+            self.counts[kind] += 1
+
+    def _throttled(self):
+        # True when this API request should be answered with a 429
+        with self._lock:
+            self._api_requests += 1
+            return bool(self.rate_limit_every) and self._api_requests % self.rate_limit_every == 0
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, body, headers=()):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in headers:
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(length)
+                if urlparse(self.path).path != "/api/token":
+                    return self._send_json(404, {"error": {"status": 404, "message": "Not found"}})
+                server._count("token")
+                self._send_json(200, {"access_token": "fake-token", "token_type": "Bearer", "expires_in": 3600})
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                parts = url.path.strip("/").split("/")
+                if len(parts) < 3 or parts[:2] != ["v1", "playlists"]:
+                    return self._send_json(404, {"error": {"status": 404, "message": "Not found"}})
+                if server.latency:
+                    time.sleep(server.latency)
+                if server._throttled():
+                    server._count("429")
+                    return self._send_json(
+                        429, {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                        headers=[("Retry-After", str(server.retry_after))],
+                    )
+                playlist_id = parts[2]
+                size = server.playlist_size(playlist_id)
+                if len(parts) == 3:
+                    server._count("playlist")
+                    return self._send_json(200, {
+                        "id": playlist_id,
+                        "name": f"Synthetic {playlist_id}",
+                        "snapshot_id": f"{playlist_id}-v1",
+                        "tracks": {"total": size},
+                    })
+                if len(parts) == 4 and parts[3] in ("items", "tracks"):
+                    server._count("items")
+                    query = parse_qs(url.query)
+                    limit = min(PAGE_LIMIT, int(query.get("limit", [PAGE_LIMIT])[0]))
+                    offset = int(query.get("offset", [0])[0])
+                    items = [{"track": synthetic_track(playlist_id, i)} for i in range(offset, min(offset + limit, size))]
+                    page_url = server.api_prefix + f"playlists/{playlist_id}/{parts[3]}?offset={{}}&limit={limit}"
+                    return self._send_json(200, {
+                        "items": items,
+                        "total": size,
+                        "limit": limit,
+                        "offset": offset,
+                        "next": page_url.format(offset + limit) if offset + limit < size else None,
+                        "previous": page_url.format(max(0, offset - limit)) if offset else None,
+                    })
+                self._send_json(404, {"error": {"status": 404, "message": "Not found"}})
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the Spotify playlist API.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--default-size", type=int, default=250, help="Tracks per playlist whose id is not synthetic<N>")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every API request")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Answer every Nth API request with 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+    server = FakeSpotifyServer(port=args.port, default_size=args.default_size, latency=args.latency,
+                               rate_limit_every=args.rate_limit_every, retry_after=args.retry_after)
+    print(f"Fake Spotify API on {server.api_prefix} (token: {server.token_url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
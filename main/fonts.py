@@ -0,0 +1,167 @@
+"""Font discovery and text measuring helpers for the card renderers.
+
+The font directories (project `main/fonts/`, then the usual Windows, macOS and
+Linux locations) are scanned once into an index of lowercase file names, and
+each style (regular/bold/italic/bold italic) is resolved to the first face
+from a preference list that exists on this machine. Arial is preferred to
+match the original cards; Liberation Sans and DejaVu Sans are metric-close
+fallbacks on Linux.
+
+Fonts are cached per `(face, size)` and text boxes per `(text, font)`, so
+fitting and wrapping never load a font or measure the same string twice.
+"""
+from functools import lru_cache
+import os
+import sys
+from PIL import ImageFont
+
+
+_THIS_DIR = os.path.dirname(__file__)
+PROJECT_FONT_DIR = os.path.join(_THIS_DIR, "fonts")
+FONT_EXTENSIONS = (".ttf", ".otf", ".ttc")
+
+# Preferred faces per (bold, italic), by lowercase file name without extension
+FONT_CANDIDATES = {
+    (False, False): ["arial", "liberationsans-regular", "dejavusans", "freesans", "helvetica"],
+    (True, False): ["arialbd", "arial bold", "liberationsans-bold", "dejavusans-bold", "freesansbold"],
+    (False, True): ["ariali", "arial italic", "liberationsans-italic", "dejavusans-oblique", "freesansoblique"],
+    (True, True): ["arialbi", "arial bold italic", "liberationsans-bolditalic", "dejavusans-boldoblique", "freesansboldoblique"],
+}
+
+
+def font_dirs():
+    """Return the directories searched for fonts, in priority order."""
+    dirs = [PROJECT_FONT_DIR]
+    extra = os.environ.get("FONT_DIRS")
+    if extra:
+        dirs.extend(d for d in extra.split(os.pathsep) if d)
+    home = os.path.expanduser("~")
+    if sys.platform.startswith("win"):
+        windir = os.environ.get("WINDIR", r"C:\Windows")
+        dirs.append(os.path.join(windir, "Fonts"))
+        local = os.environ.get("LOCALAPPDATA")
+        if local:
+            dirs.append(os.path.join(local, "Microsoft", "Windows", "Fonts"))
+    elif sys.platform == "darwin":
+        dirs += [os.path.join(home, "Library", "Fonts"), "/Library/Fonts", "/System/Library/Fonts", "/System/Library/Fonts/Supplemental"]
+    else:
+        dirs += [os.path.join(home, ".local", "share", "fonts"), os.path.join(home, ".fonts"), "/usr/local/share/fonts", "/usr/share/fonts"]
+    return dirs
+
+
+@lru_cache(maxsize=None)
+def font_index():
+    """Scan the font directories once and map lowercase file stems to paths."""
+    index = {}
+    for d in font_dirs():
+        if not os.path.isdir(d):
+            continue
+        for root, _dirs, files in os.walk(d):
+            for fname in sorted(files):
+                stem, ext = os.path.splitext(fname)
+                if ext.lower() in FONT_EXTENSIONS:
+                    # Earlier directories win (project fonts override system fonts)
+                    index.setdefault(stem.lower(), os.path.join(root, fname))
+    return index
+
+
+@lru_cache(maxsize=None)
+def resolve_font_path(bold=False, italic=False):
+    """Return the font file used for the given style, or None if nothing matched.
+
+    A missing italic falls back to the upright face and a missing bold to the
+    regular face, so a partial install still renders scalable text.
+    """
+    index = font_index()
+    styles = [(bool(bold), bool(italic)), (bool(bold), False), (False, False)]
+    for style in dict.fromkeys(styles):
+        for name in FONT_CANDIDATES[style]:
+            path = index.get(name)
+            if path:
+                return path
+    print(f"Warning: no TrueType font found for bold={bold} italic={italic}; using PIL default font.")
+    return None
+
+
+@lru_cache(maxsize=256)
+def get_font(size, bold=False, italic=False):
+    """Return a cached font of `size` pixels for the given style."""
+    path = resolve_font_path(bold, italic)
+    if path:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            pass
+    return ImageFont.load_default()
+
+
+@lru_cache(maxsize=4096)
+def text_bbox(text, font):
+    """Return the bounding box of `text` drawn at (0, 0), like `ImageDraw.textbbox`."""
+    return font.getbbox(text)
+
+
+@lru_cache(maxsize=4096)
+def text_length(text, font):
+    """Return the advance width of `text` in pixels."""
+    return font.getlength(text)
+
+
+def fit_font_size(text, max_width, max_size, min_size, bold=False, italic=False, step=2):
+    """Return `(font, bbox)` for the largest size that fits `text` in `max_width`.
+
+    Sizes are tried on the same grid as shrinking from `max_size` by `step`
+    until the text fits or `min_size` is reached, but found with a binary
+    search so only O(log n) sizes are loaded and measured.
+    """
+    # Candidate sizes max_size, max_size - step, ..., down to the first one <= min_size
+    n_steps = 0
+    if max_size > min_size:
+        n_steps = (max_size - min_size + step - 1) // step
+
+    def measure(k):
+        font = get_font(max_size - k * step, bold=bold, italic=italic)
+        bbox = text_bbox(text, font)
+        return font, bbox, bbox[2] - bbox[0] <= max_width
+
+    font, bbox, fits = measure(0)
+    if fits or n_steps == 0:
+        return font, bbox
+    # Invariant: size at `lo` does not fit; `hi` fits or is the smallest allowed size
+    lo, hi = 0, n_steps
+    best = measure(hi)
+    if best[2]:
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            result = measure(mid)
+            if result[2]:
+                hi, best = mid, result
+            else:
+                lo = mid
+    return best[0], best[1]
+
+
+def wrap_text(text, font, max_width):
+    """Greedily wrap `text` into lines no wider than `max_width`.
+
+    Every distinct word is measured once; line widths are the sum of word and
+    space advances instead of re-measuring the growing line for each word.
+    """
+    words = text.split()
+    space = text_length(" ", font)
+    lines = []
+    current = []
+    current_w = 0
+    for word in words:
+        word_w = text_length(word, font)
+        test_w = current_w + (space if current else 0) + word_w
+        if test_w > max_width and current:
+            lines.append(" ".join(current))
+            current = [word]
+            current_w = word_w
+        else:
+            current.append(word)
+            current_w = test_w
+    if current:
+        lines.append(" ".join(current))
+    return lines
@@ -9,16 +9,23 @@ try:
     load_dotenv()
 except ImportError:
     pass
-from main.qr_on_bg import create_pdf_with_qr_images
-from main.text_on_bg import create_pdf_with_text_images_rightmost_first
+from main.duplex import create_duplex_pdfs, output_paths
+from main.chunked_build import build_duplex_chunked
+from main.card_renderer import CardRenderer
 from main.spotify_utils import get_playlist_slug
-from main.config import SPOTIFY_TRACKS_JSON_TEMPLATE, QR_OUTPUT_PDF_TEMPLATE, TEXT_OUTPUT_PDF_TEMPLATE, get_playlist_url
+from main.config import SPOTIFY_TRACKS_JSON_TEMPLATE, PNG_OUTPUT_DIR_TEMPLATE, KEEP_CARD_PNGS, BUILD_CHUNK_PAGES, BUILD_CHUNK_DIR_TEMPLATE, get_playlist_url
 from main.manual_tracks import manual_tracks
-import json
+from main.catalogue import load_tracks
 
-if __name__ == "__main__":
+
+def generate_pdfs(playlist_url=None, renderer=None, pages=None):
+    """Render a playlist's card PDFs and return `(qr_pdf, text_pdf, combined_pdf)` (skipped ones are None).
+
+    `pages` (e.g. `(1, 40)`) builds only those pages' chunks; all three are
+    None until every chunk is built and the PDFs are assembled.
+    """
     # Determine playlist-specific filenames
-    playlist_url = get_playlist_url()
+    playlist_url = playlist_url or get_playlist_url()
     playlist_slug = get_playlist_slug(playlist_url)
     print(playlist_slug)
     # Look for existing per-playlist JSON files in the `main/playlist_list/` folder.
@@ -31,24 +38,37 @@ if __name__ == "__main__":
     # Candidate path based on the configured template (slug-only)
     spotify_tracks_json = SPOTIFY_TRACKS_JSON_TEMPLATE.format(playlist_slug=playlist_slug)
 
-    # Read tracks from the chosen per-playlist spotify_tracks JSON
-    with open(spotify_tracks_json, "r", encoding="utf-8") as f:
-        spotify_tracks = json.load(f)
+    # Read tracks from the catalogue (refreshed from the per-playlist JSON if it was edited)
+    spotify_tracks = load_tracks(playlist_slug, spotify_tracks_json)
     # Combine with manual_tracks
     tracks = spotify_tracks
     print(f"Gevonden {len(tracks)} nummers (spotify + handmatig).")
 
     # Use the slug resolved from the playlist URL (API-first) for output filenames
-    qr_pdf = QR_OUTPUT_PDF_TEMPLATE.format(playlist_slug=playlist_slug)
-    text_pdf = TEXT_OUTPUT_PDF_TEMPLATE.format(playlist_slug=playlist_slug)
-    # Ensure output directory exists
-    for p in (qr_pdf, text_pdf):
-        out_dir = os.path.dirname(p)
-        if out_dir and not os.path.exists(out_dir):
-            os.makedirs(out_dir, exist_ok=True)
-
-    print(qr_pdf)
-    create_pdf_with_qr_images(tracks, qr_pdf)
-    print(f"✅ QR PDF gegenereerd: {qr_pdf}")
-    create_pdf_with_text_images_rightmost_first(tracks, text_pdf)
-    print(f"✅ Tekst PDF gegenereerd: {text_pdf}")
+    # Output directories are created by `create_duplex_pdfs`
+    qr_pdf, text_pdf, combined_pdf = output_paths(playlist_slug)
+
+    # Share one renderer so both sides reuse the decoded templates and fonts
+    if renderer is None:
+        renderer = CardRenderer()
+    # Card PNGs are only written when explicitly requested
+    png_dir = PNG_OUTPUT_DIR_TEMPLATE.format(playlist_slug=playlist_slug) if KEEP_CARD_PNGS else None
+    print(qr_pdf or combined_pdf)
+    # Both sides are rendered in the same pass over the tracks, in resumable
+    # page chunks unless BUILD_CHUNK_PAGES=0
+    if BUILD_CHUNK_PAGES > 0:
+        chunk_dir = BUILD_CHUNK_DIR_TEMPLATE.format(playlist_slug=playlist_slug)
+        if not build_duplex_chunked(tracks, qr_pdf, text_pdf, chunk_dir, renderer=renderer, png_dir=png_dir, combined_pdf=combined_pdf, pages=pages):
+            return None, None, None
+    else:
+        create_duplex_pdfs(tracks, qr_pdf, text_pdf, renderer=renderer, png_dir=png_dir, combined_pdf=combined_pdf)
+    if qr_pdf:
+        print(f"✅ QR PDF gegenereerd: {qr_pdf}")
+        print(f"✅ Tekst PDF gegenereerd: {text_pdf}")
+    if combined_pdf:
+        print(f"✅ Gecombineerde PDF gegenereerd: {combined_pdf}")
+    return qr_pdf, text_pdf, combined_pdf
+
+
+if __name__ == "__main__":
+    generate_pdfs()
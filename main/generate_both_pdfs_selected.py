@@ -8,10 +8,11 @@ try:
     load_dotenv()
 except ImportError:
     pass
-from main.qr_on_bg import create_pdf_with_qr_images
-from main.text_on_bg import create_pdf_with_text_images_rightmost_first
-from main.config import QR_OUTPUT_PDF_TEMPLATE, TEXT_OUTPUT_PDF_TEMPLATE
-import json
+from main.duplex import create_duplex_pdfs, output_paths
+from main.chunked_build import build_duplex_chunked
+from main.card_renderer import CardRenderer
+from main.config import PNG_OUTPUT_DIR_TEMPLATE, KEEP_CARD_PNGS, BUILD_CHUNK_PAGES, BUILD_CHUNK_DIR_TEMPLATE
+from main.catalogue import load_tracks
 
 """
 Create PDFs from `playlist_list/spotify_tracks_wrapped_selected.json`.
@@ -23,17 +24,21 @@ Differences from `generate_both_pdfs.py`:
 
 SELECTED_PATH = os.path.join(os.path.dirname(__file__), "playlist_list", "spotify_tracks_wrapped_selected.json")
 
-if __name__ == "__main__":
+
+def generate_selected_pdfs(selected_path=SELECTED_PATH, renderer=None, pages=None):
+    """Render the selected wrapped tracks and return `(qr_pdf, text_pdf, combined_pdf)`.
+
+    `pages` builds only those pages' chunks, as in `generate_pdfs`.
+    """
     # Derive slug from selected filename but strip leading "spotify_tracks_"
-    base = os.path.splitext(os.path.basename(SELECTED_PATH))[0]
+    base = os.path.splitext(os.path.basename(selected_path))[0]
     playlist_slug = base.replace("spotify_tracks_", "")
 
     # Read selected tracks
-    if not os.path.exists(SELECTED_PATH):
-        print("Selected tracks not found:", SELECTED_PATH)
+    if not os.path.exists(selected_path):
+        print("Selected tracks not found:", selected_path)
         sys.exit(1)
-    with open(SELECTED_PATH, "r", encoding="utf-8") as f:
-        tracks = json.load(f)
+    tracks = load_tracks(playlist_slug, selected_path)
 
     # Replace `year` with `name` so the middle of the card shows the person(s)
     for t in tracks:
@@ -41,15 +46,29 @@ if __name__ == "__main__":
         t["year"] = t.get("name", "")
 
     # Build output filenames using the same templates as original script
-    qr_pdf = QR_OUTPUT_PDF_TEMPLATE.format(playlist_slug=playlist_slug)
-    text_pdf = TEXT_OUTPUT_PDF_TEMPLATE.format(playlist_slug=playlist_slug)
-    # Ensure output directory exists
-    for p in (qr_pdf, text_pdf):
-        out_dir = os.path.dirname(p)
-        if out_dir and not os.path.exists(out_dir):
-            os.makedirs(out_dir, exist_ok=True)
-
-    create_pdf_with_qr_images(tracks, qr_pdf)
-    print(f"✅ QR PDF generated: {qr_pdf}")
-    create_pdf_with_text_images_rightmost_first(tracks, text_pdf)
-    print(f"✅ Text PDF generated: {text_pdf}")
+    # Output directories are created by `create_duplex_pdfs`
+    qr_pdf, text_pdf, combined_pdf = output_paths(playlist_slug)
+
+    # Share one renderer so both sides reuse the decoded templates and fonts
+    if renderer is None:
+        renderer = CardRenderer()
+    # Card PNGs are only written when explicitly requested
+    png_dir = PNG_OUTPUT_DIR_TEMPLATE.format(playlist_slug=playlist_slug) if KEEP_CARD_PNGS else None
+    # Both sides are rendered in the same pass over the tracks, in resumable
+    # page chunks unless BUILD_CHUNK_PAGES=0
+    if BUILD_CHUNK_PAGES > 0:
+        chunk_dir = BUILD_CHUNK_DIR_TEMPLATE.format(playlist_slug=playlist_slug)
+        if not build_duplex_chunked(tracks, qr_pdf, text_pdf, chunk_dir, renderer=renderer, png_dir=png_dir, combined_pdf=combined_pdf, pages=pages):
+            return None, None, None
+    else:
+        create_duplex_pdfs(tracks, qr_pdf, text_pdf, renderer=renderer, png_dir=png_dir, combined_pdf=combined_pdf)
+    if qr_pdf:
+        print(f"✅ QR PDF generated: {qr_pdf}")
+        print(f"✅ Text PDF generated: {text_pdf}")
+    if combined_pdf:
+        print(f"✅ Combined PDF generated: {combined_pdf}")
+    return qr_pdf, text_pdf, combined_pdf
+
+
+if __name__ == "__main__":
+    generate_selected_pdfs()
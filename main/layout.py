@@ -0,0 +1,141 @@
+"""Page layout for printing cards on A4 sheets.
+
+`PageLayout` computes the page geometry once (card size, grid, margins) and
+maps a card's position in the deck to its page and (x, y) origin for a
+placement order:
+
+- "ltr": fill each row from left to right (the QR side).
+- "rtl": fill each row from right to left, so the text side lines up with
+  the QR side when the sheet is printed duplex and flipped on its long edge.
+  "mirrored" is accepted as an alias.
+
+Card bitmaps are embedded per `PDF_IMAGE_ENCODING` (flate or JPEG) and page
+content is compressed per `PDF_PAGE_COMPRESSION`; see `pdf_image` and
+`open_canvas`.
+
+Usage:
+    layout = PageLayout()
+    write_card_pdf("out.pdf", images, layout, placement="rtl")
+"""
+import io
+from reportlab import rl_config
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+from main.config import CARD_SIZE_CM, CARDS_COLS, CARDS_ROWS, PDF_IMAGE_ENCODING, PDF_JPEG_QUALITY, PDF_PAGE_COMPRESSION
+
+
+PLACEMENTS = ("ltr", "rtl", "mirrored")
+IMAGE_ENCODINGS = ("flate", "jpeg")
+
+# reportlab wraps every compressed stream in ASCII85 by default, which makes
+# the files a quarter larger and (without its C accelerator) costs about a
+# second per full-size card image. PDFs are binary files anyway.
+rl_config.useA85 = 0
+
+
+class PageLayout:
+    """Grid geometry for square cards on a page."""
+
+    def __init__(self, card_size_cm=CARD_SIZE_CM, cols=CARDS_COLS, rows=CARDS_ROWS, pagesize=A4, centered=True):
+        self.pagesize = pagesize
+        self.page_w, self.page_h = pagesize
+        self.card_w = card_size_cm * cm
+        self.card_h = card_size_cm * cm
+        self.cols = cols
+        self.rows = rows
+        self.per_page = cols * rows
+        if centered:
+            # Always center the full block, even for partially filled pages
+            self.margin_x = (self.page_w - cols * self.card_w) / 2
+            self.margin_y = (self.page_h - rows * self.card_h) / 2
+        else:
+            self.margin_x = 0
+            self.margin_y = 0
+
+    @classmethod
+    def fill_page(cls, card_size_cm=CARD_SIZE_CM, pagesize=A4):
+        """Layout with as many cards as fit, anchored at the top-left corner."""
+        card = card_size_cm * cm
+        page_w, page_h = pagesize
+        return cls(card_size_cm, int(page_w // card), int(page_h // card), pagesize, centered=False)
+
+    def card_origin(self, index, placement="ltr"):
+        """Return the bottom-left (x, y) of card `index` on its page."""
+        if placement not in PLACEMENTS:
+            raise ValueError(f"Unknown placement {placement!r}; expected one of {PLACEMENTS}")
+        slot = index % self.per_page
+        row = slot // self.cols
+        col = slot % self.cols
+        if placement != "ltr":
+            col = self.cols - 1 - col
+        x = self.margin_x + col * self.card_w
+        y = self.page_h - self.margin_y - ((row + 1) * self.card_h)
+        return x, y
+
+
+def pdf_image(img, encoding=None, quality=None):
+    """Return `img` wrapped for `drawImage`, encoded per `encoding` ("flate" or "jpeg").
+
+    JPEG data is embedded as is (DCTDecode); images with an alpha channel are
+    always stored lossless.
+    """
+    if encoding is None:
+        encoding = PDF_IMAGE_ENCODING
+    if encoding not in IMAGE_ENCODINGS:
+        raise ValueError(f"Unknown PDF image encoding {encoding!r}; expected one of {IMAGE_ENCODINGS}")
+    if encoding == "jpeg" and img.mode in ("RGB", "L"):
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=PDF_JPEG_QUALITY if quality is None else quality, optimize=True)
+        buf.seek(0)
+        return ImageReader(buf)
+    return ImageReader(img)
+
+
+def open_canvas(filename, layout):
+    """Return a reportlab canvas for `filename` with the layout's page size and the configured compression."""
+    return canvas.Canvas(filename, pagesize=layout.pagesize, pageCompression=1 if PDF_PAGE_COMPRESSION else 0)
+
+
+def begin_card(c, index, layout, placement="ltr"):
+    """Start a new page when the previous one is full and return the card's origin."""
+    if index and index % layout.per_page == 0:
+        c.showPage()
+    return layout.card_origin(index, placement)
+
+
+def draw_card(c, img, index, layout, placement="ltr"):
+    """Draw one card image at its slot; starts a new page when the previous one is full."""
+    x, y = begin_card(c, index, layout, placement)
+    c.drawImage(pdf_image(img), x, y, layout.card_w, layout.card_h)
+
+
+def draw_overlay_card(c, background_name, background, overlay, index, layout, placement="ltr"):
+    """Draw the shared background and a per-card overlay at the card's slot.
+
+    The background is embedded once per document as a form XObject named
+    `background_name` and referenced by every later card.
+    """
+    x, y = begin_card(c, index, layout, placement)
+    if not c.hasForm(background_name):
+        c.beginForm(background_name, 0, 0, layout.card_w, layout.card_h)
+        if background.mode != "RGB":
+            background = background.convert("RGB")
+        c.drawImage(pdf_image(background), 0, 0, layout.card_w, layout.card_h)
+        c.endForm()
+    c.saveState()
+    c.translate(x, y)
+    c.doForm(background_name)
+    overlay.draw(c, layout.card_w, layout.card_h)
+    c.restoreState()
+
+
+def write_card_pdf(filename, images, layout=None, placement="ltr"):
+    """Write `images` (PIL images in deck order) to `filename` using `layout`."""
+    if layout is None:
+        layout = PageLayout()
+    c = open_canvas(filename, layout)
+    for index, img in enumerate(images):
+        draw_card(c, img, index, layout, placement)
+    c.save()
@@ -0,0 +1,211 @@
+"""Per-card overlays drawn on top of a shared background in the PDF.
+
+In the "overlay" PDF output mode the card background (template plus cutting
+outline) is embedded once per PDF as a form XObject and every card only adds
+what is specific to it:
+
+- `QROverlay`: the QR code as filled vector rectangles (one per run of dark
+  modules), sitting on a white square with the quiet zone.
+- `ImageOverlay`: transparent RGBA patches (the glowing text), cropped to the
+  visible text blocks and drawn with a soft mask.
+- `TextOverlay`: the text as real PDF text in the embedded card fonts, with
+  the glow approximated by a few translucent strokes ("vector" mode).
+
+Overlays are plain picklable objects so they can be produced on the render
+pool. `draw(c, card_w, card_h)` expects the canvas origin at the card's
+bottom-left corner. `ImageOverlay` also converts to and from plain bytes
+(`to_bytes` / `from_bytes`) for the on-disk render cache.
+"""
+import io
+import json
+import os
+from PIL import Image
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+from main.glow import GLOW_RADIUS
+
+
+# Fraction of the card covered by the QR code (including its quiet zone)
+QR_BOX_FRACTION = 0.4
+
+# Vector glow: (reach in glow radii, stroke alpha) from the outside in. The
+# stacked strokes fade from faint at twice the radius to dark at the glyph
+# edge, close to the dilated and blurred raster glow.
+GLOW_STROKES = ((2.0, 0.15), (1.4, 0.25), (0.8, 0.45))
+
+_pdf_fonts = {}
+
+
+def pdf_font_name(path, style=""):
+    """Register the TrueType font at `path` with reportlab once and return its name.
+
+    Falls back to the matching built-in Helvetica when there is no font file
+    (PIL's default font) or it cannot be embedded.
+    """
+    name = _pdf_fonts.get((path, style))
+    if name is None:
+        try:
+            name = "Card-" + os.path.splitext(os.path.basename(path))[0]
+            pdfmetrics.registerFont(TTFont(name, path))
+        except (TypeError, OSError, TTFError):
+            bold = "Bold" in style
+            italic = "Italic" in style or "Oblique" in style
+            name = "Helvetica" + ("-" if bold or italic else "") + ("Bold" if bold else "") + ("Oblique" if italic else "")
+        _pdf_fonts[(path, style)] = name
+    return name
+
+
+class QROverlay:
+    """A QR module matrix drawn as vector rectangles in the middle of the card."""
+
+    def __init__(self, matrix, box_fraction=QR_BOX_FRACTION):
+        self.matrix = matrix
+        self.box_fraction = box_fraction
+
+    def draw(self, c, card_w, card_h):
+        n = len(self.matrix)
+        size = self.box_fraction * min(card_w, card_h)
+        module = size / n
+        x0 = (card_w - size) / 2
+        y0 = (card_h - size) / 2
+        c.saveState()
+        c.setFillColorRGB(1, 1, 1)
+        c.rect(x0, y0, size, size, stroke=0, fill=1)
+        c.setFillColorRGB(0, 0, 0)
+        # Merge horizontal runs of dark modules into one rectangle each
+        path = c.beginPath()
+        for r, row in enumerate(self.matrix):
+            y = y0 + (n - 1 - r) * module
+            col = 0
+            while col < n:
+                if row[col]:
+                    start = col
+                    while col < n and row[col]:
+                        col += 1
+                    path.rect(x0 + start * module, y, (col - start) * module, module)
+                else:
+                    col += 1
+        c.drawPath(path, stroke=0, fill=1)
+        c.restoreState()
+
+
+class ImageOverlay:
+    """Transparent image patches placed at pixel offsets on a card of `card_px` pixels."""
+
+    def __init__(self, patches, card_px):
+        # List of (image, (left, top)) in card pixel coordinates
+        self.patches = patches
+        self.card_px = card_px
+
+    def draw(self, c, card_w, card_h):
+        sx = card_w / self.card_px[0]
+        sy = card_h / self.card_px[1]
+        for image, (left, top) in self.patches:
+            w, h = image.size
+            c.drawImage(ImageReader(image), left * sx, card_h - (top + h) * sy, w * sx, h * sy, mask="auto")
+
+    def to_bytes(self):
+        """Return the overlay as a JSON header line followed by the patches as PNG files."""
+        blobs = []
+        for image, _pos in self.patches:
+            buf = io.BytesIO()
+            image.save(buf, "PNG", compress_level=1)
+            blobs.append(buf.getvalue())
+        header = {
+            "card_px": list(self.card_px),
+            "patches": [[left, top, len(blob)] for (_image, (left, top)), blob in zip(self.patches, blobs)],
+        }
+        return json.dumps(header).encode("utf-8") + b"\n" + b"".join(blobs)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Inverse of `to_bytes`; raises ValueError or OSError on malformed data."""
+        header, _, body = data.partition(b"\n")
+        header = json.loads(header)
+        patches = []
+        offset = 0
+        for left, top, size in header["patches"]:
+            with Image.open(io.BytesIO(body[offset:offset + size])) as image:
+                image.load()
+            patches.append((image, (left, top)))
+            offset += size
+        return cls(patches, tuple(header["card_px"]))
+
+
+class TextOverlay:
+    """Text lines drawn as PDF text on a card of `card_px` pixels, white with a black glow."""
+
+    def __init__(self, lines, card_px, glow_radius=GLOW_RADIUS):
+        # List of (text, font path, font style, size px, x px, baseline px)
+        self.lines = lines
+        self.card_px = card_px
+        self.glow_radius = glow_radius
+
+    @classmethod
+    def from_layout(cls, layout, card_px, glow_radius=GLOW_RADIUS):
+        """Build from `(pos, text, font)` lines laid out for `ImageDraw.text`."""
+        lines = []
+        for (x, y), text, font in layout:
+            path = getattr(font, "path", None)
+            style = font.getname()[1] or ""
+            # PIL places text by its ascender line; PDF text by its baseline
+            ascent = font.getmetrics()[0]
+            lines.append((text, path if isinstance(path, str) else None, style, font.size, x, y + ascent))
+        return cls(lines, card_px, glow_radius)
+
+    def draw(self, c, card_w, card_h):
+        sx = card_w / self.card_px[0]
+        sy = card_h / self.card_px[1]
+        c.saveState()
+        c.setLineJoin(1)
+        c.setStrokeColorRGB(0, 0, 0)
+        # All glow strokes first so no glow covers a neighbouring line's letters.
+        # The text render mode is graphics state, so each stroke pass is wrapped
+        # in save/restore to get back to plain filled text afterwards.
+        for reach, alpha in GLOW_STROKES:
+            c.saveState()
+            c.setStrokeAlpha(alpha)
+            c.setLineWidth(2 * reach * self.glow_radius * sx)
+            for line in self.lines:
+                self._draw_line(c, line, sx, sy, card_h, mode=1)
+            c.restoreState()
+        c.setFillColorRGB(1, 1, 1)
+        for line in self.lines:
+            self._draw_line(c, line, sx, sy, card_h, mode=0)
+        c.restoreState()
+
+    @staticmethod
+    def _draw_line(c, line, sx, sy, card_h, mode):
+        text, path, style, size, x, baseline = line
+        t = c.beginText()
+        t.setTextRenderMode(mode)
+        t.setFont(pdf_font_name(path, style), size * sy)
+        t.setTextOrigin(x * sx, card_h - baseline * sy)
+        t.textOut(text)
+        c.drawText(t)
+
+
+def crop_overlay(layer):
+    """Cut a full-card RGBA `layer` into patches around its visible pixels.
+
+    Each horizontal band of non-empty rows (e.g. the artist, the year and the
+    title block) becomes its own patch cropped to its visible width, so the
+    empty space between the text blocks is not embedded at all.
+    """
+    alpha = layer.getchannel("A")
+    _cols, rows = alpha.getprojection()
+    patches = []
+    y = 0
+    H = len(rows)
+    while y < H:
+        if not rows[y]:
+            y += 1
+            continue
+        top = y
+        while y < H and rows[y]:
+            y += 1
+        band = alpha.crop((0, top, layer.size[0], y)).getbbox()
+        box = (band[0], top, band[2], y)
+        patches.append((layer.crop(box), box[:2]))
+    return ImageOverlay(patches, layer.size)
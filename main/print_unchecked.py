@@ -1,11 +1,29 @@
-import json
+"""Print the tracks of a playlist whose cards have not been checked yet.
+
+Usage:
+    python main/print_unchecked.py [playlist_slug]   # default: oud_en_nieuw_hitster
+"""
+import os
+import sys
 from pprint import pprint
 
-path = "main/playlist_list/spotify_tracks_oud_en_nieuw_hitster.json"
+# make repo root importable like other scripts
+_repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _repo_root not in sys.path:
+    sys.path.insert(0, _repo_root)
+
+from main.catalogue import load_tracks
+
+DEFAULT_SLUG = "oud_en_nieuw_hitster"
 
-with open(path, "r", encoding="utf-8") as f:
-    data = json.load(f)
 
-for item in data:
-    if not item.get("checked", False):
+def print_unchecked(playlist_slug=DEFAULT_SLUG):
+    # Only the unchecked rows are read from the catalogue (indexed on `checked`)
+    items = load_tracks(playlist_slug, checked=False)
+    for item in items:
         pprint(item)
+    return items
+
+
+if __name__ == "__main__":
+    print_unchecked(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_SLUG)
@@ -0,0 +1,341 @@
+"""Per-stage timing for the build pipeline.
+
+Wrap a stage in `stage()` (or decorate it with `timed()`); while profiling is
+on every call records wall time, CPU time of the calling thread and the
+process's peak RSS, and calls tagged with an `item` (a track URL) also feed
+the list of slowest cards per stage:
+
+    with profiling.stage("qr.draw", item=url):
+        ...
+
+    @profiling.timed("spotify.fetch")
+    def get_playlist_tracks(url): ...
+
+Profiling is off unless `PROFILE` is set (or `enable()` is called). When off,
+`stage()` returns a shared no-op context manager and `timed()` wrappers call
+straight through, so the instrumentation costs one flag check per call.
+
+When on, a JSON report (`PROFILE_REPORT`) and a summary table are written at
+exit. Render workers send their records back to the parent with each batch
+(see `main.render_pool`), so card stages are counted whatever `RENDER_WORKERS`
+is. `PROFILE_STAGE=<name>` also runs cProfile around every call of that stage
+and saves the combined stats next to the report (`<report>.prof`).
+
+Stages are nested freely; each one reports its own inclusive time.
+"""
+import atexit
+import cProfile
+import functools
+import heapq
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from main.config import PROFILE, PROFILE_REPORT, PROFILE_SLOWEST, PROFILE_STAGE
+
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS
+    resource = None
+
+
+class _State:
+    enabled = False
+    report_path = None
+    profile_stage = None
+
+
+_state = _State()
+_lock = threading.Lock()
+# stage name -> {"count", "wall", "cpu", "max_wall", "peak_rss_kb"}
+_stages = {}
+# stage name -> min-heap of (wall, item) holding the slowest calls
+_slowest = {}
+_profiler = None
+_profiler_busy = False
+# cProfile stats sent back by worker processes
+_worker_profiles = []
+_started = None
+
+
+def peak_rss_kb():
+    """Return this process's peak resident set size in KiB, or None where unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("name", "item", "wall", "cpu", "profiling")
+
+    def __init__(self, name, item):
+        self.name = name
+        self.item = item
+
+    def __enter__(self):
+        self.profiling = self.name == _state.profile_stage and _start_profiler()
+        self.cpu = time.thread_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.thread_time() - self.cpu
+        if self.profiling:
+            _stop_profiler()
+        _record(self.name, wall, cpu, self.item)
+        return False
+
+
+def stage(name, item=None):
+    """Return a context manager timing one call of stage `name` (a no-op while profiling is off)."""
+    if not _state.enabled:
+        return _NULL_STAGE
+    return _Stage(name, item)
+
+
+def timed(name, item_arg=None):
+    """Decorator timing every call of the function as stage `name`.
+
+    `item_arg` is the index of the positional argument recorded as the
+    call's item (e.g. 0 for a track URL passed first); a track dict is
+    recorded by its URL.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return fn(*args, **kwargs)
+            item = args[item_arg] if item_arg is not None and len(args) > item_arg else None
+            if isinstance(item, dict):
+                item = item.get("url") or item.get("title")
+            with _Stage(name, item):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _record(name, wall, cpu, item):
+    rss = peak_rss_kb()
+    with _lock:
+        s = _stages.get(name)
+        if s is None:
+            s = _stages[name] = {"count": 0, "wall": 0.0, "cpu": 0.0, "max_wall": 0.0, "peak_rss_kb": None}
+        s["count"] += 1
+        s["wall"] += wall
+        s["cpu"] += cpu
+        if wall > s["max_wall"]:
+            s["max_wall"] = wall
+        if rss is not None and (s["peak_rss_kb"] is None or rss > s["peak_rss_kb"]):
+            s["peak_rss_kb"] = rss
+        if item is not None:
+            _push_slowest(name, wall, str(item))
+
+
+def _push_slowest(name, wall, item):
+    heap = _slowest.setdefault(name, [])
+    if len(heap) < PROFILE_SLOWEST:
+        heapq.heappush(heap, (wall, item))
+    elif wall > heap[0][0]:
+        heapq.heapreplace(heap, (wall, item))
+
+
+def _start_profiler():
+    # One cProfile session per process; nested or concurrent calls of the
+    # profiled stage are timed but not profiled again
+    global _profiler, _profiler_busy
+    with _lock:
+        if _profiler_busy:
+            return False
+        _profiler_busy = True
+        if _profiler is None:
+            _profiler = cProfile.Profile()
+    _profiler.enable()
+    return True
+
+
+def _stop_profiler():
+    global _profiler_busy
+    _profiler.disable()
+    with _lock:
+        _profiler_busy = False
+
+
+def is_enabled():
+    return _state.enabled
+
+
+def enable(report_path=None, profile_stage=None, write_at_exit=True):
+    """Turn profiling on; the report goes to `report_path` (default `PROFILE_REPORT`) at exit."""
+    global _started
+    if _state.enabled:
+        return
+    _state.enabled = True
+    _state.report_path = report_path or PROFILE_REPORT
+    _state.profile_stage = profile_stage or PROFILE_STAGE or None
+    _started = time.perf_counter()
+    if write_at_exit:
+        atexit.register(_write_at_exit)
+
+
+def worker_config():
+    """Return what a worker process needs to profile like this one, or None when profiling is off."""
+    if not _state.enabled:
+        return None
+    return {"profile_stage": _state.profile_stage}
+
+
+def enable_worker(config):
+    """Turn profiling on in a worker process; its records are sent back with `drain()`."""
+    global _profiler
+    if config is None:
+        return
+    # A forked worker starts with a copy of the parent's records
+    with _lock:
+        _stages.clear()
+        _slowest.clear()
+        _worker_profiles.clear()
+        _profiler = None
+    enable(profile_stage=config["profile_stage"], write_at_exit=False)
+
+
+def drain():
+    """Return and clear this process's records (for a worker to send to the parent), or None when off."""
+    global _profiler
+    if not _state.enabled:
+        return None
+    with _lock:
+        records = {
+            "stages": {name: dict(s) for name, s in _stages.items()},
+            "slowest": {name: list(heap) for name, heap in _slowest.items()},
+        }
+        _stages.clear()
+        _slowest.clear()
+        if _profiler is not None and not _profiler_busy:
+            _profiler.create_stats()
+            records["profile"] = _profiler.stats
+            _profiler = None
+    return records
+
+
+def merge(records):
+    """Add records returned by `drain()` in another process."""
+    if not records:
+        return
+    with _lock:
+        for name, other in records["stages"].items():
+            s = _stages.get(name)
+            if s is None:
+                _stages[name] = dict(other)
+                continue
+            s["count"] += other["count"]
+            s["wall"] += other["wall"]
+            s["cpu"] += other["cpu"]
+            s["max_wall"] = max(s["max_wall"], other["max_wall"])
+            if other["peak_rss_kb"] is not None and (s["peak_rss_kb"] is None or other["peak_rss_kb"] > s["peak_rss_kb"]):
+                s["peak_rss_kb"] = other["peak_rss_kb"]
+        for name, heap in records["slowest"].items():
+            for wall, item in heap:
+                _push_slowest(name, wall, item)
+        if records.get("profile"):
+            _worker_profiles.append(records["profile"])
+
+
+def report():
+    """Return the collected timings as a JSON-serialisable dict."""
+    with _lock:
+        stages = {}
+        for name, s in sorted(_stages.items(), key=lambda kv: -kv[1]["wall"]):
+            stages[name] = {
+                "count": s["count"],
+                "wall_s": round(s["wall"], 6),
+                "cpu_s": round(s["cpu"], 6),
+                "mean_ms": round(1000 * s["wall"] / s["count"], 3),
+                "max_ms": round(1000 * s["max_wall"], 3),
+                "peak_rss_mb": round(s["peak_rss_kb"] / 1024, 1) if s["peak_rss_kb"] is not None else None,
+            }
+        slowest = {
+            name: [{"item": item, "wall_ms": round(1000 * wall, 3)} for wall, item in sorted(heap, reverse=True)]
+            for name, heap in sorted(_slowest.items())
+        }
+    rss = peak_rss_kb()
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "argv": sys.argv,
+        "total_wall_s": round(time.perf_counter() - _started, 6) if _started is not None else None,
+        "peak_rss_mb": round(rss / 1024, 1) if rss is not None else None,
+        "stages": stages,
+        "slowest": slowest,
+        "profile_stage": _state.profile_stage,
+    }
+
+
+class _StatsHolder:
+    # What `pstats.Stats` expects from a profiler: `create_stats()` and `.stats`
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def write_report(path=None):
+    """Write the JSON report (and the cProfile stats, if a stage was profiled); return the report."""
+    path = path or _state.report_path
+    data = report()
+    out_dir = os.path.dirname(path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    profiles = list(_worker_profiles)
+    if _profiler is not None and not _profiler_busy:
+        _profiler.create_stats()
+        profiles.append(_profiler.stats)
+    if profiles:
+        stats = pstats.Stats(_StatsHolder(profiles[0]))
+        for other in profiles[1:]:
+            stats.add(_StatsHolder(other))
+        stats.dump_stats(os.path.splitext(path)[0] + ".prof")
+    return data
+
+
+def print_summary(data=None, file=None):
+    data = data or report()
+    file = file or sys.stderr
+    print(f"{'stage':<18} {'count':>7} {'wall s':>9} {'cpu s':>9} {'mean ms':>9} {'max ms':>9} {'rss MB':>8}", file=file)
+    for name, s in data["stages"].items():
+        rss = f"{s['peak_rss_mb']:.1f}" if s["peak_rss_mb"] is not None else "-"
+        print(f"{name:<18} {s['count']:>7} {s['wall_s']:>9.3f} {s['cpu_s']:>9.3f} {s['mean_ms']:>9.2f} {s['max_ms']:>9.2f} {rss:>8}", file=file)
+    for name, items in data["slowest"].items():
+        if items:
+            print(f"slowest {name}: " + ", ".join(f"{i['item']} ({i['wall_ms']:.1f} ms)" for i in items[:3]), file=file)
+
+
+def _write_at_exit():
+    import multiprocessing
+    # Spawned workers import this module too; only the main process reports
+    if not _stages or multiprocessing.parent_process() is not None:
+        return
+    data = write_report()
+    print_summary(data)
+    print(f"Profile report written to {_state.report_path}", file=sys.stderr)
+
+
+if PROFILE:
+    enable()
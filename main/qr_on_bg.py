@@ -1,15 +1,14 @@
 from PIL import Image
 import qrcode
-import io
-import math
-import requests
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import cm
-from datetime import datetime
-import os
+import re
+from functools import lru_cache
 from main.spotify_utils import get_playlist_tracks
-from main.config import QR_BG_IMAGE, QR_OUTPUT_PDF, CARD_SIZE_CM, CARDS_COLS, CARDS_ROWS
+from main.config import QR_OUTPUT_PDF, CARD_SIZE_CM, CARDS_COLS, CARDS_ROWS, QR_COMPACT_URLS
+from main.card_renderer import get_renderer, save_card_pngs
+from main.render_pool import iter_render_cards
+from main.layout import PageLayout, write_card_pdf
+from main.overlays import QROverlay
+from main import profiling
 
 # --- Import manual tracks from external file ---
 from main.manual_tracks import manual_tracks
@@ -18,76 +17,116 @@ from main.config import get_playlist_url
 
 # `get_playlist_tracks` is now centralized in `main.spotify_utils`.
 
-def generate_qr_code(url):
+# QR settings; part of the render cache key, so changing them re-renders the cards
+QR_VERSION = 2
+QR_BOX_SIZE = 10
+QR_BORDER = 2
+QR_CARD_FRACTION = 0.4
+
+def _build_qr(url):
     qr = qrcode.QRCode(
-        version=2,
+        version=QR_VERSION,
         error_correction=qrcode.constants.ERROR_CORRECT_M,
-        box_size=10,
-        border=2,
+        box_size=QR_BOX_SIZE,
+        border=QR_BORDER,
     )
     qr.add_data(url)
     qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
+    return qr
+
+_TRACK_URL_RE = re.compile(r"^https?://open\.spotify\.com/(?:intl-[a-z-]+/)?track/([A-Za-z0-9]+)")
+
+def canonical_track_url(url):
+    """Return `https://open.spotify.com/track/<id>` for a Spotify track URL (no query string or locale).
+
+    Anything that is not a track URL is returned unchanged.
+    """
+    m = _TRACK_URL_RE.match(url.strip())
+    return f"https://open.spotify.com/track/{m.group(1)}" if m else url
+
+def qr_payload(url):
+    """Return the text encoded in the QR code for `url` (compacted when `QR_COMPACT_URLS` is set)."""
+    return canonical_track_url(url) if QR_COMPACT_URLS else url
+
+def generate_qr_code(url):
+    img = _build_qr(url).make_image(fill_color="black", back_color="white")
     return img
 
-def create_qr_on_bg(track_url, out_path):
-    bg = Image.open(QR_BG_IMAGE).convert("RGBA")
+@lru_cache(maxsize=4096)
+def qr_matrix(url):
+    """Return the QR modules for `url` as rows of booleans (True = dark), quiet zone included.
+
+    Cached per URL; the result is shared, so treat it as read-only.
+    """
+    with profiling.stage("qr.encode"):
+        return tuple(tuple(row) for row in _build_qr(url).get_matrix())
+
+def qr_image(url, size):
+    """Return the QR code for `url` as a 1-bit `size` x `size` image.
+
+    Every module is painted as a square of whole pixels (nearest-neighbour
+    scaling of the module matrix, no resampling); the pixels left over when
+    `size` is not a multiple of the module count become extra white margin
+    around the centered code.
+    """
+    matrix = qr_matrix(url)
+    n = len(matrix)
+    module = max(1, size // n)
+    modules = Image.frombytes("L", (n, n), bytes(0 if dark else 255 for row in matrix for dark in row))
+    code = modules.resize((n * module, n * module), Image.NEAREST).convert("1", dither=Image.Dither.NONE)
+    img = Image.new("1", (size, size), 1)
+    offset = (size - n * module) // 2
+    img.paste(code, (offset, offset))
+    return img
+
+def _qr_card_key(payload, renderer):
+    return renderer.face_key(
+        "qr_card", renderer.qr_bg_image, url=payload,
+        qr=[QR_VERSION, "M", QR_BORDER, QR_CARD_FRACTION, "nearest"],
+    )
+
+@profiling.timed("card.qr", item_arg=0)
+def create_qr_card(track_url, renderer=None):
+    """Return the QR side of a card as an image (RGB unless the template has transparency)."""
+    if renderer is None:
+        renderer = get_renderer()
+    payload = qr_payload(track_url)
+    return renderer.cached_card(_qr_card_key(payload, renderer), lambda: _draw_qr_card(payload, renderer))
+
+@profiling.timed("qr.draw")
+def _draw_qr_card(payload, renderer):
+    # Template copy already carries the white cutting outline
+    bg = renderer.qr_background()
     bg_w, bg_h = bg.size
-    qr_size = int(0.4 * min(bg_w, bg_h))
-    qr_img = generate_qr_code(track_url).resize((qr_size, qr_size), Image.LANCZOS).convert("RGBA")
+    qr_size = int(QR_CARD_FRACTION * min(bg_w, bg_h))
     # Center QR on background
     x = (bg_w - qr_size) // 2
     y = (bg_h - qr_size) // 2
-    bg.paste(qr_img, (x, y), qr_img)
-    # Draw a white outline for cutting
-    outline_width = max(2, bg_w//100)  # At least 2px, scale with image size
-    from PIL import ImageDraw
-    outline_draw = ImageDraw.Draw(bg)
-    outline_draw.rectangle([(outline_width//2, outline_width//2), (bg_w-outline_width//2-1, bg_h-outline_width//2-1)], outline="white", width=outline_width)
-    bg.save(out_path)
-    return out_path
-
-def create_pdf_with_qr_images(tracks, filename=QR_OUTPUT_PDF):
+    bg.paste(qr_image(payload, qr_size), (x, y))
+    return bg
+
+@profiling.timed("card.qr", item_arg=0)
+def create_qr_overlay(track_url, renderer=None):
+    """Return the QR side as a vector overlay for the shared-background PDF mode."""
+    return QROverlay(qr_matrix(qr_payload(track_url)))
+
+@profiling.timed("card.qr", item_arg=0)
+def create_qr_on_bg(track_url, out_path, renderer=None):
+    if renderer is None:
+        renderer = get_renderer()
+    payload = qr_payload(track_url)
+    return renderer.save_cached_card(_qr_card_key(payload, renderer), lambda: _draw_qr_card(payload, renderer), out_path)
+
+def create_pdf_with_qr_images(tracks, filename=QR_OUTPUT_PDF, renderer=None, workers=None, png_dir=None):
     # Each image should be 6.5cm x 6.5cm on paper
     img_cm = CARD_SIZE_CM
-    images = []
-    temp_files = []
-    for i, track in enumerate(tracks):
-        temp_path = f"temp_qr_{i}.png"
-        create_qr_on_bg(track["url"], temp_path)
-        images.append(temp_path)
-        temp_files.append(temp_path)
-    c = canvas.Canvas(filename, pagesize=A4)
-    page_w, page_h = A4
-    img_w = img_cm * cm
-    img_h = img_cm * cm
-    cols = CARDS_COLS
-    rows = CARDS_ROWS
-    per_page = cols * rows
-    block_w = cols * img_w
-    block_h = rows * img_h
-    margin_x = (page_w - block_w) / 2
-    margin_y = (page_h - block_h) / 2
-    for page_start in range(0, len(images), per_page):
-        page_images = images[page_start:page_start+per_page]
-        for row in range(rows):
-            row_start = row * cols
-            row_imgs = page_images[row_start:row_start+cols]
-            n_imgs_in_row = len(row_imgs)
-            # Always fill from left to right, even for partial rows, and always center block
-            for i, img_path in enumerate(row_imgs):
-                x = margin_x + i * img_w
-                y = page_h - margin_y - ((row + 1) * img_h)
-                c.drawImage(img_path, x, y, img_w, img_h)
-        if page_start + per_page < len(images):
-            c.showPage()
-    c.save()
-    # Clean up temp files
-    for f in temp_files:
-        try:
-            os.remove(f)
-        except Exception:
-            pass
+    # Cards are rendered (in parallel unless workers=1) and placed as they arrive,
+    # in track order, and go to reportlab in memory. PNGs only when `png_dir` is given.
+    images = iter_render_cards(create_qr_card, ((track["url"],) for track in tracks), renderer, workers)
+    if png_dir:
+        images = save_card_pngs(images, png_dir, "qr_back")
+    # Always fill from left to right, even for partial rows, and always center block
+    write_card_pdf(filename, images, PageLayout(img_cm, CARDS_COLS, CARDS_ROWS), placement="ltr")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,174 @@
+"""Content-addressed on-disk cache for rendered card faces.
+
+A face is stored under the SHA-256 of everything that affects how it looks:
+the track fields it shows, the background template's file hash, the fonts,
+the QR/glow parameters and the card size. Changing any of them gives a new
+key, so entries never need invalidating; unused ones are evicted oldest
+first once the cache grows past `RENDER_CACHE_MAX_MB`.
+
+Entries are plain files (`<dir>/ab/abcdef....png` for card images, `.bin`
+for overlays), written atomically so several render workers can share one
+cache directory. A hit refreshes the entry's mtime, which makes eviction
+least-recently-used. Entries only ever hold data (PNG images, overlays as
+`to_bytes` writes them), never pickles, so whoever can write to a shared
+cache directory cannot run code in the build. A cache that cannot be read or
+written only costs a re-render; it never fails one.
+
+Usage:
+    cache = RenderCache("/tmp/cards")
+    key = cache_key("text_card", artist="...", title="...", year="1999")
+    img = cache.image(key, lambda: render_the_card())
+
+Set `RENDER_CACHE_DIR` to an empty string to turn the cache off.
+"""
+import hashlib
+import io
+import json
+import os
+import shutil
+from PIL import Image
+from main import profiling
+from main.atomic_files import atomic_write
+from main.config import RENDER_CACHE_DIR, RENDER_CACHE_MAX_MB
+
+
+# Bump when the drawing code changes what a face looks like for the same inputs
+CACHE_VERSION = 1
+
+
+def file_digest(path):
+    """Return the SHA-256 hex digest of the file at `path`."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(kind, **inputs):
+    """Return the cache key of a `kind` of face rendered from `inputs` (JSON-serialisable values)."""
+    payload = json.dumps({"v": CACHE_VERSION, "kind": kind, "inputs": inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """A directory of rendered faces addressed by `cache_key`, bounded to `max_mb` megabytes."""
+
+    def __init__(self, directory=RENDER_CACHE_DIR, max_mb=RENDER_CACHE_MAX_MB):
+        self.directory = directory
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        # Bytes stored by this process since the last eviction pass
+        self._written = 0
+
+    def path(self, key, ext):
+        return os.path.join(self.directory, key[:2], key + ext)
+
+    def lookup(self, key, ext):
+        """Return the entry's path if it is cached (and mark it as recently used), else None."""
+        path = self.path(key, ext)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def store(self, key, ext, data):
+        """Write `data` (bytes) as the entry for `key` and return its path."""
+        path = self.path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Readers (other workers) never see half a file
+        atomic_write(path, data)
+        self._written += len(data)
+        if self._written > self.max_bytes // 10:
+            self.evict()
+        return path
+
+    def image(self, key, render):
+        """Return the cached image for `key`, or call `render()` and cache its result."""
+        path = self.lookup(key, ".png")
+        if path:
+            try:
+                with profiling.stage("png.decode"), Image.open(path) as im:
+                    im.load()
+                    return im
+            except OSError:
+                pass  # Truncated or unreadable entry: render it again
+        img = render()
+        buf = io.BytesIO()
+        # Fast compression; these files are read back, not shipped
+        with profiling.stage("png.encode"):
+            img.save(buf, "PNG", compress_level=1)
+        self._try_store(key, ".png", buf.getvalue())
+        return img
+
+    def save_image(self, key, render, out_path):
+        """Write the face for `key` to `out_path` as PNG, copying the cached file when there is one."""
+        path = self.lookup(key, ".png")
+        if path:
+            try:
+                shutil.copyfile(path, out_path)
+                return out_path
+            except FileNotFoundError:
+                pass  # Evicted by another process since the lookup: render it again
+        img = render()
+        with profiling.stage("png.encode"):
+            img.save(out_path)
+        with open(out_path, "rb") as f:
+            self._try_store(key, ".png", f.read())
+        return out_path
+
+    def object(self, key, render, dump, load):
+        """Like `image` for other values, stored as the bytes `dump(value)` returns and read back with `load(data)`."""
+        path = self.lookup(key, ".bin")
+        if path:
+            try:
+                with open(path, "rb") as f:
+                    return load(f.read())
+            except (OSError, ValueError, KeyError, TypeError):
+                pass  # Truncated or unreadable entry: render it again
+        value = render()
+        self._try_store(key, ".bin", dump(value))
+        return value
+
+    def _try_store(self, key, ext, data):
+        try:
+            self.store(key, ext, data)
+        except OSError:
+            pass  # Full disk, read-only or vanished directory: keep rendering uncached
+
+    def evict(self):
+        """Delete the least recently used entries until the cache fits in `max_bytes`."""
+        self._written = 0
+        entries = []
+        total = 0
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                # Writes in progress (`atomic_path` temp files) belong to other workers
+                if name.startswith(".") or name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        if total <= self.max_bytes:
+            return
+        # Trim to 90% so the next few stores do not immediately evict again
+        target = self.max_bytes * 9 // 10
+        for _mtime, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+
+def default_render_cache():
+    """Return a `RenderCache` for the configured directory, or None when caching is disabled."""
+    if not RENDER_CACHE_DIR or RENDER_CACHE_MAX_MB <= 0:
+        return None
+    return RenderCache(RENDER_CACHE_DIR, RENDER_CACHE_MAX_MB)
@@ -0,0 +1,147 @@
+"""Fan per-card rendering out to a pool of worker processes.
+
+Each worker builds its own `CardRenderer` once (in the pool initializer), so
+templates and fonts stay loaded for every card it renders. Results are
+returned in the order of the input, which keeps the PDF layout and the
+mirrored text side in step with the track list.
+
+Usage:
+    render_cards(create_qr_on_bg, [(url, path), ...], workers=8)
+    for img in iter_render_cards(create_qr_card, ((url,) for url in urls)):
+        ...
+
+Each call starts its own pool unless it is given one: builds that render in
+several steps (e.g. the chunks of `main.chunked_build`) open one with
+`open_render_pool` and pass it as `pool=`, so the workers load templates,
+fonts and the cache only once per build.
+
+`render_fn` must be a module-level function (so it can be pickled) that
+accepts its positional arguments followed by a `renderer` keyword.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+from itertools import islice
+import os
+from main.card_renderer import CardRenderer, get_renderer
+from main.config import RENDER_WORKERS
+from main import profiling
+
+
+_worker_renderer = None
+
+
+def resolve_workers(workers=None):
+    """Return the worker count to use; None means `RENDER_WORKERS`, 0 means CPU count."""
+    if workers is None:
+        workers = RENDER_WORKERS
+    if not workers or workers < 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def _init_worker(qr_bg_image, text_bg_image, cache, dpi, profile=None):
+    global _worker_renderer
+    profiling.enable_worker(profile)
+    # Workers share the parent's render cache directory (False: caching off)
+    _worker_renderer = CardRenderer(qr_bg_image, text_bg_image, cache=cache or False, dpi=dpi)
+
+
+def _call_batch(render_fn, batch):
+    results = [render_fn(*args, renderer=_worker_renderer) for args in batch]
+    # Stage timings recorded in this worker travel back with the batch
+    return results, profiling.drain()
+
+
+class RenderPool:
+    """Worker processes set up with `renderer`'s templates, DPI and cache; use as a context manager."""
+
+    def __init__(self, renderer, workers):
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(renderer.qr_bg_image, renderer.text_bg_image, renderer.cache, renderer.dpi, profiling.worker_config()),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.executor.shutdown()
+
+
+def open_render_pool(renderer=None, workers=None):
+    """Return a context manager giving a `RenderPool` to share between calls, or None for one worker."""
+    if renderer is None:
+        renderer = get_renderer()
+    workers = resolve_workers(workers)
+    if workers <= 1:
+        return contextlib.nullcontext()
+    return RenderPool(renderer, workers)
+
+
+def iter_render_cards(render_fn, args_iter, renderer=None, workers=None, window=12, pool=None):
+    """Yield `render_fn(*args, renderer=...)` for each entry of `args_iter`, in order.
+
+    Streaming counterpart of `render_cards`: at most about `window` cards are
+    queued or rendered ahead of the consumer, so memory stays constant however
+    many tracks there are. `args_iter` may be a generator. With `pool` (from
+    `open_render_pool` for the same renderer) its workers are used and
+    `workers` is ignored.
+    """
+    if renderer is None:
+        renderer = get_renderer()
+    if pool is not None:
+        yield from _iter_pool(render_fn, args_iter, pool, window)
+    else:
+        workers = resolve_workers(workers)
+        if workers <= 1:
+            for args in args_iter:
+                yield render_fn(*args, renderer=renderer)
+        else:
+            with RenderPool(renderer, workers) as own_pool:
+                yield from _iter_pool(render_fn, args_iter, own_pool, window)
+    _trim_cache(renderer)
+
+
+def _iter_pool(render_fn, args_iter, pool, window):
+    # Small batches amortise IPC; keep two batches per worker in flight
+    batch_size = max(1, window // (2 * pool.workers))
+    max_pending = max(2, 2 * pool.workers)
+    args_iter = iter(args_iter)
+    pending = deque()
+    exhausted = False
+    while True:
+        while not exhausted and len(pending) < max_pending:
+            batch = list(islice(args_iter, batch_size))
+            if not batch:
+                exhausted = True
+                break
+            pending.append(pool.executor.submit(_call_batch, render_fn, batch))
+        if not pending:
+            break
+        results, records = pending.popleft().result()
+        profiling.merge(records)
+        for result in results:
+            yield result
+
+
+def _trim_cache(renderer):
+    # Workers only evict when they wrote a lot; one pass here keeps the size bound
+    if renderer.cache is not None:
+        renderer.cache.evict()
+
+
+def render_cards(render_fn, arg_list, renderer=None, workers=None, pool=None):
+    """Call `render_fn(*args, renderer=...)` for every entry of `arg_list`.
+
+    Runs in this process when one worker is requested or there is only one
+    card; otherwise uses a process pool (`pool` if given). Results keep the
+    input order.
+    """
+    arg_list = list(arg_list)
+    workers = min(resolve_workers(workers), max(1, len(arg_list)))
+    # A few batches per worker balances load without per-card IPC overhead
+    window = max(1, len(arg_list) // 2)
+    return list(iter_render_cards(render_fn, arg_list, renderer, workers, window, pool=pool))
@@ -2,7 +2,7 @@
 """Select wrapped tracks in a round-robin fashion.
 
 Rules implemented:
-- Read `playlist_list/spotify_tracks_wrapped_full.json` and `input files/wrapped_hitster.json` (to preserve name order)
+- Read `playlist_list/spotify_tracks_wrapped_full.json` (through the catalogue, see `main.catalogue`) and `input files/wrapped_hitster.json` (to preserve name order)
 - Round-robin: for each full pass, loop over all names in the wrapped list order, then check stop condition
 - Per name: add the most "popular" song not yet in result (popularity = earliest `order` across all lists)
 - Do not add if song URL already in result
@@ -11,11 +11,18 @@ Rules implemented:
 - Stop when result size == number_of_persons * 30 OR no more additions possible
 - Output to `playlist_list/spotify_tracks_wrapped_selected.json`
 """
-from collections import defaultdict
+from collections import Counter, defaultdict
 import json
 import os
 import sys
 
+# make repo root importable like other scripts
+_repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _repo_root not in sys.path:
+    sys.path.insert(0, _repo_root)
+
+from main.catalogue import load_tracks, slug_for
+
 
 ROOT = os.path.dirname(os.path.abspath(__file__))
 IN_FULL = os.path.join(ROOT, "playlist_list", "spotify_tracks_wrapped_full.json")
@@ -41,16 +48,97 @@ def to_int_safe(v, default=9999999):
         return default
 
 
-def main():
-    if not os.path.exists(IN_FULL):
-        print("Missing input:", IN_FULL)
+def select_round_robin(persons, person_candidates, url_to_items, url_min_order, target_size):
+    """Pick tracks per person in rounds until `target_size` is reached or nobody can add one.
+
+    Every rule only ever rejects more as the result grows (URL taken, album
+    taken, artist at its limit), so a candidate rejected once stays rejected:
+    each person keeps a cursor into their candidate list and never looks at
+    it again. Artist counts and albums are kept in indexes instead of being
+    recounted from the result.
+    """
+    result = []
+    result_urls = set()
+    # lowercased first artist -> songs in result
+    artist_counts = Counter()
+    # lowercased albums in result
+    albums = set()
+    cursors = {name: 0 for name in persons}
+    combined_names = {}
+
+    def rejected(url, it):
+        if not url or url in result_urls:
+            return True
+        # album constraint: skip if another song from same album already selected
+        album_name = (it.get("album") or "").strip()
+        if album_name and album_name.lower() in albums:
+            return True
+        # artist constraint
+        first_artist = get_first_artist(it.get("artist", ""))
+        return bool(first_artist) and artist_counts[first_artist.lower()] >= 3
+
+    # Round-robin loop: complete a full pass over persons before checking stop
+    while True:
+        added_this_round = 0
+        for name in persons:
+            # find first candidate for this person that satisfies rules
+            cand_list = person_candidates.get(name, [])
+            pos = cursors[name]
+            while pos < len(cand_list) and rejected(cand_list[pos][2], cand_list[pos][3]):
+                pos += 1
+            if pos == len(cand_list):
+                cursors[name] = pos
+                continue
+            cursors[name] = pos + 1
+            _gmin, _personal_order, url, it = cand_list[pos]
+
+            # combine names: collect all distinct names this url appears under
+            if url not in combined_names:
+                names = sorted({entry["name"] for entry in url_to_items.get(url, []) if entry.get("name")})
+                combined_names[url] = ", ".join(names) if names else None
+            out_item = {
+                "title": it.get("title", ""),
+                "artist": it.get("artist", ""),
+                "album": it.get("album", ""),
+                "year": it.get("year", ""),
+                "url": url,
+                "checked": False,
+                "name": combined_names[url] or name,
+                # store minimal order across lists
+                "order": url_min_order.get(url, to_int_safe(it.get("order")))
+            }
+            result.append(out_item)
+            result_urls.add(url)
+            album_name = (out_item["album"] or "").strip()
+            if album_name:
+                albums.add(album_name.lower())
+            first_artist = get_first_artist(out_item["artist"])
+            if first_artist:
+                artist_counts[first_artist.lower()] += 1
+            added_this_round += 1
+
+            # stop early if we reached target? requirement: finish full pass then check, so we don't break here
+
+        # after full pass
+        if len(result) >= target_size:
+            break
+        if added_this_round == 0:
+            # nothing more can be added
+            break
+    return result
+
+
+def main(in_full=IN_FULL, wrapped_path=WRAPPED, out=OUT):
+    """Select the wrapped deck from `in_full` and write it to `out`; return the selected tracks."""
+    if not os.path.exists(wrapped_path):
+        print("Missing wrapped list (name order):", wrapped_path)
         sys.exit(1)
-    if not os.path.exists(WRAPPED):
-        print("Missing wrapped list (name order):", WRAPPED)
+    try:
+        full = load_tracks(slug_for(in_full), in_full)
+    except FileNotFoundError:
+        print("Missing input:", in_full)
         sys.exit(1)
-
-    full = load_json(IN_FULL)
-    wrapped = load_json(WRAPPED)
+    wrapped = load_json(wrapped_path)
 
     # preserve persons order from wrapped file
     persons = [p.get("name") for p in wrapped if p.get("name")]
@@ -94,89 +182,17 @@ def main():
         cand.sort(key=lambda x: (x[0], x[1]))
         person_candidates[name] = cand
 
-    result = []
-    result_urls = set()
-
-    # Helper to count first-artist occurrences in result
-    def artist_count(first_artist):
-        if not first_artist:
-            return 0
-        cnt = 0
-        for r in result:
-            fa = get_first_artist(r.get("artist", ""))
-            if fa and fa.lower() == first_artist.lower():
-                cnt += 1
-        return cnt
-
-    # Helper to check if an album is already present in result
-    def album_exists(album_name):
-        if not album_name:
-            return False
-        for r in result:
-            a = (r.get("album") or "").strip()
-            if a and a.lower() == album_name.lower():
-                return True
-        return False
-
-    # Round-robin loop: complete a full pass over persons before checking stop
-    while True:
-        added_this_round = 0
-        for name in persons:
-            # find first candidate for this person that satisfies rules
-            cand_list = person_candidates.get(name, [])
-            chosen = None
-            for (gmin, personal_order, url, it) in cand_list:
-                if not url or url in result_urls:
-                    continue
-                # album constraint: skip if another song from same album already selected
-                album_name = (it.get("album") or "").strip()
-                if album_exists(album_name):
-                    continue
-                # artist constraint
-                first_artist = get_first_artist(it.get("artist", ""))
-                if artist_count(first_artist) >= 3:
-                    continue
-                # passed checks -> choose this
-                chosen = (url, it)
-                break
-
-            if chosen:
-                url, it = chosen
-                # combine names: collect all distinct names this url appears under
-                names = sorted({entry["name"] for entry in url_to_items.get(url, []) if entry.get("name")})
-                combined_name = ", ".join(names) if names else name
-                out_item = {
-                    "title": it.get("title", ""),
-                    "artist": it.get("artist", ""),
-                    "album": it.get("album", ""),
-                    "year": it.get("year", ""),
-                    "url": url,
-                    "checked": False,
-                    "name": combined_name,
-                    # store minimal order across lists
-                    "order": url_min_order.get(url, to_int_safe(it.get("order")))
-                }
-                result.append(out_item)
-                result_urls.add(url)
-                added_this_round += 1
-
-            # stop early if we reached target? requirement: finish full pass then check, so we don't break here
-
-        # after full pass
-        if len(result) >= target_size:
-            break
-        if added_this_round == 0:
-            # nothing more can be added
-            break
+    result = select_round_robin(persons, person_candidates, url_to_items, url_min_order, target_size)
 
     # write output
-    out_dir = os.path.dirname(OUT)
+    out_dir = os.path.dirname(out)
     if out_dir and not os.path.exists(out_dir):
         os.makedirs(out_dir, exist_ok=True)
-    with open(OUT, "w", encoding="utf-8") as f:
+    with open(out, "w", encoding="utf-8") as f:
         json.dump(result, f, ensure_ascii=False, indent=2)
 
-    print(f"Wrote {len(result)} tracks to {OUT} (target {target_size})")
+    print(f"Wrote {len(result)} tracks to {out} (target {target_size})")
+    return result
 
 
 if __name__ == "__main__":
@@ -5,85 +5,331 @@ multiple scripts in `main/`.
 
 This module reads `SPOTIFY_CLIENT_ID` and `SPOTIFY_CLIENT_SECRET` from the
 environment and raises a `RuntimeError` if they are not present.
+
+All calls in a process share one Spotify client, one pooled HTTP session and
+one access token (see `_get_spotify_client`). API calls go through
+`call_spotify`, which backs every thread off together when Spotify answers
+429 and retries transient failures with jittered exponential backoff.
+
+`sync_playlist` keeps the tracks of each playlist in `PLAYLIST_CACHE_DIR`
+together with its `snapshot_id`, and only downloads them again when the
+snapshot changed.
 """
+import json
 import os
-from spotipy import Spotify
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from spotipy import Spotify, SpotifyException
+from spotipy.cache_handler import CacheFileHandler, MemoryCacheHandler
 from spotipy.oauth2 import SpotifyClientCredentials
+from urllib3.util.retry import Retry
+from main import profiling
+from main.atomic_files import atomic_write
+from main.config import PLAYLIST_CACHE_DIR, SPOTIFY_API_PREFIX, SPOTIFY_FETCH_WORKERS, SPOTIFY_MAX_RETRIES, SPOTIFY_PLAYLIST_WORKERS, SPOTIFY_TOKEN_CACHE, SPOTIFY_TOKEN_URL
+
+
+_client = None
+_session = None
+_client_lock = threading.Lock()
+
+# Status codes worth retrying; 429 is handled separately through `Retry-After`
+TRANSIENT_STATUS = (500, 502, 503, 504)
+
+
+class RateLimiter:
+    """A backoff deadline shared by all threads talking to Spotify."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._until = 0.0
+
+    def wait(self):
+        """Sleep until the current backoff (if any) has passed."""
+        while True:
+            with self._lock:
+                delay = self._until - time.monotonic()
+            if delay <= 0:
+                return
+            # Up to 10% extra so waiting threads do not all resume at once
+            time.sleep(delay * random.uniform(1.0, 1.1))
+
+    def back_off(self, seconds):
+        """Hold all requests for at least `seconds` from now."""
+        with self._lock:
+            self._until = max(self._until, time.monotonic() + seconds)
+
+
+rate_limiter = RateLimiter()
+
+
+def _retry_after(exc):
+    try:
+        return float((exc.headers or {}).get("Retry-After", 1))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+@profiling.timed("spotify.request")
+def call_spotify(fn, *args, **kwargs):
+    """Call a spotipy method, honouring 429 `Retry-After` and retrying transient errors.
+
+    A 429 makes every thread wait out the `Retry-After` delay. 5xx responses
+    and connection errors are retried with jittered exponential backoff. After
+    `SPOTIFY_MAX_RETRIES` retries, or on any other error, the exception is
+    raised.
+    """
+    attempt = 0
+    while True:
+        rate_limiter.wait()
+        try:
+            return fn(*args, **kwargs)
+        except SpotifyException as exc:
+            if attempt >= SPOTIFY_MAX_RETRIES:
+                raise
+            if exc.http_status == 429:
+                rate_limiter.back_off(_retry_after(exc))
+            elif exc.http_status in TRANSIENT_STATUS:
+                time.sleep(_backoff_delay(attempt))
+            else:
+                raise
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt >= SPOTIFY_MAX_RETRIES:
+                raise
+            time.sleep(_backoff_delay(attempt))
+        attempt += 1
+
+
+def _backoff_delay(attempt):
+    # Full jitter, capped at 30 s
+    return random.uniform(0, min(30.0, 0.5 * 2 ** attempt))
+
+
+def get_http_session():
+    """Return the process-wide `requests.Session` used for all Spotify traffic.
+
+    Connections are kept alive and pooled, enough for every concurrent fetch
+    (`SPOTIFY_PLAYLIST_WORKERS` playlists of `SPOTIFY_FETCH_WORKERS` pages).
+    Only connection failures are retried at this level; status codes are left
+    to `call_spotify` so a 429 can pause every thread at once.
+    """
+    global _session
+    with _client_lock:
+        if _session is None:
+            session = requests.Session()
+            retry = Retry(
+                total=3,
+                connect=None,
+                read=False,
+                allowed_methods=frozenset(["GET", "POST", "PUT", "DELETE"]),
+                status=0,
+                backoff_factor=0.3,
+                # Otherwise urllib3 sleeps on 429s itself and spotipy loses the headers
+                respect_retry_after_header=False,
+            )
+            pool_size = max(10, SPOTIFY_FETCH_WORKERS * SPOTIFY_PLAYLIST_WORKERS)
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
 
 
 def _get_spotify_client():
+    """Return the process-wide Spotify client, creating it on first use.
+
+    The client-credentials token is cached in `SPOTIFY_TOKEN_CACHE` and reused
+    (also by later runs) until it expires, so a run normally requests at most
+    one token.
+    """
+    global _client
     CLIENT_ID = os.environ.get("SPOTIFY_CLIENT_ID")
     CLIENT_SECRET = os.environ.get("SPOTIFY_CLIENT_SECRET")
     if not CLIENT_ID or not CLIENT_SECRET:
         raise RuntimeError("Please set SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET as environment variables.")
-    return Spotify(auth_manager=SpotifyClientCredentials(
-        client_id=CLIENT_ID,
-        client_secret=CLIENT_SECRET
-    ))
+    session = get_http_session()
+    with _client_lock:
+        if _client is None:
+            # Tokens from a stand-in API (see `main.fake_spotify`) must never
+            # end up in the on-disk cache used against the real one
+            if SPOTIFY_TOKEN_CACHE and not (SPOTIFY_API_PREFIX or SPOTIFY_TOKEN_URL):
+                cache_handler = CacheFileHandler(cache_path=SPOTIFY_TOKEN_CACHE)
+            else:
+                cache_handler = MemoryCacheHandler()
+            auth_manager = SpotifyClientCredentials(
+                client_id=CLIENT_ID,
+                client_secret=CLIENT_SECRET,
+                requests_session=session,
+                cache_handler=cache_handler,
+            )
+            if SPOTIFY_TOKEN_URL:
+                auth_manager.OAUTH_TOKEN_URL = SPOTIFY_TOKEN_URL
+            _client = Spotify(auth_manager=auth_manager, requests_session=session)
+            if SPOTIFY_API_PREFIX:
+                _client.prefix = SPOTIFY_API_PREFIX
+    return _client
+
 
+# Only what `get_playlist_tracks` reads; Spotify drops everything else from the pages
+PLAYLIST_ITEM_FIELDS = "total,items(track(name,artists(name),album(name,release_date),external_urls(spotify)))"
+# Maximum page size of the playlist items endpoint
+PLAYLIST_PAGE_SIZE = 100
 
-def get_playlist_tracks(playlist_url):
+
+def _page_tracks(page):
+    tracks = []
+    for item in page.get("items", []):
+        track = item.get("track")
+        if not track:
+            continue
+        title = track.get("name", "")
+        artists = track.get("artists", [])
+        artist_names = ', '.join([a.get("name", "") for a in artists])
+        release_year = ""
+        album = track.get("album")
+        if album:
+            release_year = (album.get("release_date") or "").split("-")[0]
+        url = (track.get("external_urls") or {}).get("spotify", "")
+        tracks.append({
+            "title": title,
+            "artist": artist_names,
+            "year": release_year,
+            "album": album.get("name", "") if album else "",
+            "url": url
+        })
+    return tracks
+
+
+@profiling.timed("spotify.fetch", item_arg=0)
+def get_playlist_tracks(playlist_url, workers=None):
     """Return a list of tracks for the given Spotify playlist URL.
 
-    Each returned track is a dict with keys: `title`, `artist`, `year`, `url`.
+    Each returned track is a dict with keys: `title`, `artist`, `year`, `album`, `url`.
+
+    The first page tells how many items there are; the remaining pages are
+    fetched concurrently on up to `workers` threads (default
+    `SPOTIFY_FETCH_WORKERS`) and put back together in playlist order.
     """
     sp = _get_spotify_client()
 
     playlist_id = playlist_url.split("/")[-1].split("?")[0]
-    results = sp.playlist_items(playlist_id, additional_types=["track"])
 
-    tracks = []
-    while results:
-        for item in results.get("items", []):
-            track = item.get("track")
-            if not track:
-                continue
-            title = track.get("name", "")
-            artists = track.get("artists", [])
-            artist_names = ', '.join([a.get("name", "") for a in artists])
-            release_year = ""
-            album = track.get("album")
-            if album:
-                release_year = album.get("release_date", "").split("-")[0]
-            url = track.get("external_urls", {}).get("spotify", "")
-            tracks.append({
-                "title": title,
-                "artist": artist_names,
-                "year": release_year,
-                "album": album.get("name", "") if album else "",
-                "url": url
-            })
-        if results.get("next"):
-            results = sp.next(results)
-        else:
-            results = None
+    def fetch(offset):
+        return call_spotify(
+            sp.playlist_items, playlist_id, fields=PLAYLIST_ITEM_FIELDS, limit=PLAYLIST_PAGE_SIZE,
+            offset=offset, additional_types=["track"],
+        )
+
+    first = fetch(0)
+    offsets = range(PLAYLIST_PAGE_SIZE, first.get("total") or 0, PLAYLIST_PAGE_SIZE)
+    if workers is None:
+        workers = SPOTIFY_FETCH_WORKERS
+    tracks = _page_tracks(first)
+    if offsets:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(offsets)))) as pool:
+            # map() yields the pages in offset order, whatever order they arrive in
+            for page in pool.map(fetch, offsets):
+                tracks.extend(_page_tracks(page))
     return tracks
 
 
+def playlist_id(playlist_url):
+    """Return the playlist id (last URL segment, without query string)."""
+    return playlist_url.split("/")[-1].split("?")[0] if playlist_url else ""
+
+
+def slugify(name):
+    """Lowercase `name`, use underscores for spaces and keep only `[a-z0-9_-]` (max 64 chars)."""
+    s = name.lower().replace(" ", "_")
+    s = re.sub(r"[^a-z0-9_\-]", "", s)
+    return s[:64].strip("_-") or "playlist"
+
+
+_meta = {}
+
+
+@profiling.timed("spotify.meta", item_arg=0)
+def get_playlist_meta(playlist_url):
+    """Return `{"name", "snapshot_id"}` of a playlist with one small request, memoised per process."""
+    pid = playlist_id(playlist_url)
+    meta = _meta.get(pid)
+    if meta is None:
+        sp = _get_spotify_client()
+        data = call_spotify(sp.playlist, pid, fields="name,snapshot_id") or {}
+        meta = _meta[pid] = {"name": data.get("name", ""), "snapshot_id": data.get("snapshot_id", "")}
+    return meta
+
+
+def _cache_path(pid):
+    return os.path.join(PLAYLIST_CACHE_DIR, f"{pid}.json")
+
+
+def load_playlist_cache(playlist_url):
+    """Return the cached metadata and tracks of a playlist, or None."""
+    if not PLAYLIST_CACHE_DIR:
+        return None
+    try:
+        with open(_cache_path(playlist_id(playlist_url)), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_playlist_cache(entry):
+    path = _cache_path(entry["playlist_id"])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    atomic_write(path, json.dumps(entry, ensure_ascii=False))
+
+
+@profiling.timed("spotify.sync", item_arg=0)
+def sync_playlist(playlist_url):
+    """Return the playlist's cache entry, refetching the tracks only when the playlist changed.
+
+    The entry holds `playlist_id`, `name`, `slug`, `snapshot_id` and `tracks`
+    (as returned by `get_playlist_tracks`), plus `changed`: False when the
+    snapshot matched the local cache and no tracks were downloaded.
+    """
+    meta = get_playlist_meta(playlist_url)
+    cached = load_playlist_cache(playlist_url)
+    if cached and meta["snapshot_id"] and cached.get("snapshot_id") == meta["snapshot_id"]:
+        return dict(cached, changed=False)
+    entry = {
+        "playlist_id": playlist_id(playlist_url),
+        "name": meta["name"],
+        "slug": slugify(meta["name"] or playlist_id(playlist_url)),
+        "snapshot_id": meta["snapshot_id"],
+        "tracks": get_playlist_tracks(playlist_url),
+    }
+    if PLAYLIST_CACHE_DIR:
+        _save_playlist_cache(entry)
+    return dict(entry, changed=True)
+
+
+@profiling.timed("spotify.slug", item_arg=0)
 def get_playlist_slug(playlist_url):
     """Return a simple slug for the playlist name.
 
-    - Try to fetch the playlist name via the Spotify API.
-    - If available, lowercase it and replace spaces with underscores.
-    - If not available, fall back to the playlist id (last segment of URL).
+    - Try to fetch the playlist name via the Spotify API (shared with
+      `sync_playlist`, so it costs no extra request).
+    - Otherwise use the name from the local playlist cache.
+    - If neither is available, fall back to the playlist id (last segment of URL).
     """
     # derive raw id for fallback
-    pid = playlist_url.split("/")[-1].split("?")[0] if playlist_url else ""
+    pid = playlist_id(playlist_url)
 
     # try API for name
     name = ""
     try:
-        sp = _get_spotify_client()
-        data = sp.playlist(pid)
-        name = data.get("name", "") if data else ""
+        name = get_playlist_meta(playlist_url)["name"]
     except Exception:
-        name = ""
+        cached = load_playlist_cache(playlist_url) if pid else None
+        name = cached.get("name", "") if cached else ""
 
     if not name:
         name = pid
 
-    s = name.lower().replace(" ", "_")
-    import re
-    s = re.sub(r"[^a-z0-9_\-]", "", s)
-    s = s[:64].strip("_-") or "playlist"
-    return s
\ No newline at end of file
+    return slugify(name)